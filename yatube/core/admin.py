@@ -0,0 +1,128 @@
+"""Базовые классы для админки больших таблиц.
+
+ScalableModelAdmin не считает точный COUNT(*) по всей таблице и, помимо
+номеров страниц, умеет листать список курсором по (created, pk) без
+OFFSET. Если список отсортирован по другому столбцу, остаются только
+номера страниц.
+"""
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_VAR = 'cursor'
+
+ESTIMATE_QUERIES = {
+    'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+    'postgresql': 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+}
+
+
+def estimate_table_rows(model, using='default'):
+    """Оценка числа строк таблицы по статистике СУБД или None."""
+    connection = connections[using]
+    query = ESTIMATE_QUERIES.get(connection.vendor)
+    if query is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который не считает точное количество строк.
+
+    Для нефильтрованного списка берёт оценку из статистики СУБД, иначе
+    считает не дальше count_limit строк.
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate:
+                return estimate
+        return queryset[:self.count_limit].count()
+
+
+class CursorChangeList(ChangeList):
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.cursor_paging = False
+        self.next_cursor_url = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def parse_cursor(self):
+        created, _, pk = self.cursor.rpartition('|')
+        if not pk.isdigit():
+            return None, None
+        return parse_datetime(created), int(pk)
+
+    def ordered_by_cursor(self, request, queryset):
+        """Совпадает ли порядок списка с порядком курсора."""
+        default = self._get_deterministic_ordering(
+            list(self.model_admin.get_ordering(request)))
+        return self.get_ordering(request, queryset.order_by()) == default
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        self.cursor_paging = self.ordered_by_cursor(request, queryset)
+        if not self.cursor_paging:
+            self.cursor = None
+        if not self.cursor:
+            return queryset
+        created, pk = self.parse_cursor()
+        cursor_field = self.model_admin.cursor_field
+        if pk is None:
+            return queryset
+        if cursor_field is None or created is None:
+            return queryset.filter(pk__lt=pk)
+        return queryset.filter(
+            Q(**{f'{cursor_field}__lt': created})
+            | Q(**{cursor_field: created, 'pk__lt': pk})
+        )
+
+    def get_results(self, request):
+        if self.cursor:
+            self.page_num = 0
+        super().get_results(request)
+        if (not self.cursor_paging or not self.multi_page
+                or not len(self.result_list)):
+            return
+        last = list(self.result_list)[-1]
+        cursor_field = self.model_admin.cursor_field
+        created = (getattr(last, cursor_field).isoformat() if cursor_field
+                   else '')
+        self.next_cursor_url = self.get_query_string(
+            {CURSOR_VAR: f'{created}|{last.pk}'}, [PAGE_VAR]
+        )
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    cursor_field = 'created'
+
+    def get_ordering(self, request):
+        if self.cursor_field:
+            return (f'-{self.cursor_field}', '-pk')
+        return ('-pk',)
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
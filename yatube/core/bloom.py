@@ -0,0 +1,45 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Фильтр Блума: без ложноотрицательных ответов, с редкими
+    ложноположительными."""
+
+    def __init__(self, size, hashes, bits=None):
+        self.size = size
+        self.hashes = hashes
+        if bits is None:
+            bits = bytes((size + 7) // 8)
+        self.bits = bytearray(bits)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        hashes = max(1, round(size / capacity * math.log(2)))
+        return cls(size, hashes)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(value)
+        )
+
+    def dumps(self):
+        return self.size, self.hashes, bytes(self.bits)
+
+    @classmethod
+    def loads(cls, data):
+        return cls(*data)
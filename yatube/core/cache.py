@@ -0,0 +1,86 @@
+"""Защита кэша от одновременного пересчёта (cache stampede).
+
+Значение хранится вместе с мягким сроком годности и временем, которое
+ушло на его вычисление. После мягкого срока запись ещё STAMPEDE_STALE_TTL
+секунд лежит в кэше: её пересчитывает один воркер, взявший блокировку
+через cache.add, а остальные в это время отдают устаревшее значение.
+Чтобы пересчёт не совпадал у всех с границей TTL, он начинается заранее
+с вероятностью, растущей к концу срока (XFetch).
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+from . import metrics
+
+LOCK_KEY = '{}:lock'
+
+
+def should_refresh(expires, delta, now, beta):
+    """Решает, пора ли пересчитать значение, вычисленное за delta секунд."""
+    return now - delta * beta * math.log(1 - random.random()) >= expires
+
+
+def store(cache, key, value, timeout, delta):
+    if timeout is None:
+        cache.set(key, (value, math.inf, delta), None)
+    else:
+        cache.set(key, (value, time.time() + timeout, delta),
+                  timeout + settings.STAMPEDE_STALE_TTL)
+
+
+def recompute(cache, key, compute, timeout):
+    start = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - start
+    store(cache, key, value, timeout, delta)
+    metrics.observe('cache.recompute_seconds', delta)
+    return value
+
+
+def wait_for(cache, key):
+    """Ждёт, пока значение посчитает воркер, держащий блокировку."""
+    deadline = time.monotonic() + settings.STAMPEDE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if isinstance(entry, tuple):
+            return entry
+    return None
+
+
+def get_or_set(key, compute, timeout, cache=default_cache, beta=None):
+    """Возвращает значение из кэша или вычисляет его через compute().
+
+    Одновременно compute() для ключа выполняет только один воркер.
+    """
+    if beta is None:
+        beta = settings.STAMPEDE_BETA
+    entry = cache.get(key)
+    if isinstance(entry, tuple):
+        value, expires, delta = entry
+        if not should_refresh(expires, delta, time.time(), beta):
+            return value
+        lock_key = LOCK_KEY.format(key)
+        if not cache.add(lock_key, 1, settings.STAMPEDE_LOCK_TIMEOUT):
+            metrics.increment('cache.stale_hits')
+            return value
+        try:
+            return recompute(cache, key, compute, timeout)
+        finally:
+            cache.delete(lock_key)
+    metrics.increment('cache.misses')
+    lock_key = LOCK_KEY.format(key)
+    if cache.add(lock_key, 1, settings.STAMPEDE_LOCK_TIMEOUT):
+        try:
+            return recompute(cache, key, compute, timeout)
+        finally:
+            cache.delete(lock_key)
+    entry = wait_for(cache, key)
+    if entry is not None:
+        return entry[0]
+    # Воркер с блокировкой не успел: считаем сами, но не пишем в кэш.
+    return compute()
@@ -0,0 +1,153 @@
+"""Прозрачное сжатие длинных текстов в TextField.
+
+Текст длиннее TEXT_COMPRESSION_MIN_BYTES хранится в базе как метка,
+id словаря и base64 от zlib-потока:
+
+    \x1bz:<id словаря или пусто>:<base64>
+
+Короткие тексты и тексты, которые не сжимаются, хранятся как есть,
+поэтому в таблице могут одновременно лежать оба вида. Общий словарь
+(TEXT_COMPRESSION_DICTIONARY - файл с типичными фразами) помогает
+сжимать короткие тексты. Поиск по подстроке в сжатых полях делает
+filter_contains. После смены словаря старый нужно оставить
+в TEXT_COMPRESSION_DICTIONARIES ({id: путь}): строки читаются словарём
+из своей метки, пока команда compress_texts их не перекодирует.
+"""
+import base64
+import hashlib
+import time
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+
+from . import metrics
+
+MARKER = '\x1bz:'
+
+
+@lru_cache(maxsize=None)
+def load_dictionary(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return hashlib.sha1(data).hexdigest()[:8], data
+
+
+def current_dictionary():
+    """Возвращает (id, байты) словаря из настроек или ('', None)."""
+    if not settings.TEXT_COMPRESSION_DICTIONARY:
+        return '', None
+    return load_dictionary(settings.TEXT_COMPRESSION_DICTIONARY)
+
+
+def dictionary_by_id(dictionary_id):
+    """Возвращает байты словаря, которым сжата строка с dictionary_id."""
+    current_id, dictionary = current_dictionary()
+    if dictionary_id == current_id:
+        return dictionary
+    path = settings.TEXT_COMPRESSION_DICTIONARIES.get(dictionary_id)
+    if path is None:
+        raise ImproperlyConfigured(
+            f'Текст сжат словарём {dictionary_id}: его нет ни в '
+            f'TEXT_COMPRESSION_DICTIONARY, ни в '
+            f'TEXT_COMPRESSION_DICTIONARIES.'
+        )
+    loaded_id, dictionary = load_dictionary(path)
+    if loaded_id != dictionary_id:
+        raise ImproperlyConfigured(
+            f'Файл {path} - словарь {loaded_id}, а не {dictionary_id}.'
+        )
+    return dictionary
+
+
+def is_compressed(value):
+    return isinstance(value, str) and value.startswith(MARKER)
+
+
+def compress(text):
+    """Возвращает значение для базы: сжатое, если это выгодно."""
+    if not text:
+        return text
+    raw = text.encode()
+    # Текст, похожий на сжатый, сохраняем сжатым, чтобы decompress
+    # не принял его за чужой формат.
+    if len(raw) < settings.TEXT_COMPRESSION_MIN_BYTES and not is_compressed(
+            text):
+        return text
+    dictionary_id, dictionary = current_dictionary()
+    compressor = (zlib.compressobj(settings.TEXT_COMPRESSION_LEVEL,
+                                   zdict=dictionary) if dictionary
+                  else zlib.compressobj(settings.TEXT_COMPRESSION_LEVEL))
+    payload = compressor.compress(raw) + compressor.flush()
+    encoded = '{}{}:{}'.format(MARKER, dictionary_id,
+                               base64.b64encode(payload).decode('ascii'))
+    if len(encoded) >= len(raw) and not is_compressed(text):
+        return text
+    return encoded
+
+
+def decompress(value):
+    """Возвращает исходный текст для значения из базы."""
+    if not is_compressed(value):
+        return value
+    start = time.monotonic()
+    dictionary_id, payload = value[len(MARKER):].split(':', 1)
+    if dictionary_id:
+        decompressor = zlib.decompressobj(
+            zdict=dictionary_by_id(dictionary_id))
+    else:
+        decompressor = zlib.decompressobj()
+    raw = base64.b64decode(payload)
+    text = (decompressor.decompress(raw) + decompressor.flush()).decode()
+    metrics.observe('compression.decode_seconds', time.monotonic() - start)
+    return text
+
+
+def recompress(queryset, field, chunk_size=500):
+    """Перекодирует field у всех строк queryset пачками.
+
+    Работает через values_list и bulk_update, поэтому подходит и для
+    исторических моделей в миграциях. Возвращает байты исходного
+    текста, хранимые байты до и после.
+    """
+    model = queryset.model
+    raw_bytes = stored_before = stored_after = 0
+    changed = []
+    for pk, value in queryset.values_list('pk', field).iterator(chunk_size):
+        text = decompress(value)
+        encoded = compress(text)
+        raw_bytes += len(text.encode())
+        stored_before += len(value.encode())
+        stored_after += len(encoded.encode())
+        if encoded != value:
+            changed.append(model(pk=pk, **{field: encoded}))
+        if len(changed) == chunk_size:
+            queryset.bulk_update(changed, [field])
+            changed = []
+    queryset.bulk_update(changed, [field])
+    return raw_bytes, stored_before, stored_after
+
+
+def filter_contains(queryset, field, phrase, limit=None, chunk_size=500):
+    """Строки queryset, в которых field содержит phrase без учёта регистра.
+
+    Сжатые значения база сравнить не может: они распаковываются и
+    проверяются здесь, поэтому queryset стоит сузить заранее. limit
+    ограничивает распаковку самыми новыми (по pk) сжатыми строками.
+    """
+    compressed = Q(**{f'{field}__startswith': MARKER})
+    candidates = queryset.filter(compressed).order_by('-pk')
+    if limit is not None:
+        candidates = candidates[:limit]
+    needle = phrase.lower()
+    found = [
+        pk for pk, value in candidates.values_list('pk', field)
+        .iterator(chunk_size)
+        if needle in decompress(value).lower()
+    ]
+    return queryset.filter(
+        (Q(**{f'{field}__icontains': phrase}) & ~compressed)
+        | Q(pk__in=found)
+    )
@@ -0,0 +1,159 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified)
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.static import was_modified_since
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+ACCEPT_ENCODING_RE = re.compile(r'\b(br|gzip)\b')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def accepted_encodings(request):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    return set(ACCEPT_ENCODING_RE.findall(header))
+
+
+def etag_of(stat):
+    return '"{:x}-{:x}"'.format(int(stat.st_mtime * 1000), stat.st_size)
+
+
+def not_modified(request, etag, stat):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return etag in parse_etags(if_none_match)
+    return not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                                  stat.st_mtime, stat.st_size)
+
+
+def byte_range(request, etag, stat):
+    """Возвращает (start, end) из заголовка Range или None.
+
+    Поддерживается один диапазон: несколько диапазонов или устаревший
+    If-Range отдают файл целиком. Для диапазона за концом файла
+    возвращается False.
+    """
+    match = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and (
+            parse_http_date_safe(if_range) != int(stat.st_mtime)):
+        return None
+    first, last = match.groups()
+    size = stat.st_size
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def read_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def offload(path, full_path, content_type):
+    """Ответ, по которому файл отдаёт веб-сервер перед сайтом.
+
+    FILES_SENDFILE - 'x-sendfile' (Apache, lighttpd) или
+    'x-accel-redirect' (nginx, путь от internal-location
+    FILES_ACCEL_PREFIX). Range веб-сервер обрабатывает сам.
+    """
+    response = HttpResponse(content_type=content_type)
+    if settings.FILES_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote(settings.FILES_ACCEL_PREFIX
+                                             + path)
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def file_response(request, full_path, content_type, etag, stat):
+    requested = byte_range(request, etag, stat)
+    if requested is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+    elif requested is None:
+        response = FileResponse(open(full_path, 'rb'),
+                                content_type=content_type)
+    else:
+        start, end = requested
+        response = FileResponse(
+            read_range(open(full_path, 'rb'), start, end - start + 1),
+            status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_file(request, document_root, path, immutable=False,
+               precompressed=False, sendfile=False):
+    """Отдаёт файл из document_root с заголовками кэширования.
+
+    Если precompressed и клиент их принимает, отдаётся заранее сжатый
+    вариант файла (.br или .gz) рядом с оригиналом. Поддерживаются ETag,
+    условные запросы и Range. При sendfile и включённом FILES_SENDFILE
+    содержимое файла отдаёт веб-сервер, а не воркер.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    full_path = safe_join(document_root, path)
+    if not os.path.isfile(full_path):
+        raise Http404
+    content_type = mimetypes.guess_type(full_path)[0]
+    content_type = content_type or 'application/octet-stream'
+    encoding = None
+    if precompressed:
+        accepted = accepted_encodings(request)
+        for name, suffix in PRECOMPRESSED:
+            if name in accepted and os.path.isfile(full_path + suffix):
+                encoding = name
+                path += suffix
+                full_path += suffix
+                break
+    stat = os.stat(full_path)
+    etag = etag_of(stat)
+    if not_modified(request, etag, stat):
+        response = HttpResponseNotModified()
+    elif sendfile and settings.FILES_SENDFILE:
+        response = offload(path, full_path, content_type)
+    else:
+        response = file_response(request, full_path, content_type, etag,
+                                 stat)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if precompressed:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    if immutable:
+        response['Cache-Control'] = (
+            f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        )
+    return response
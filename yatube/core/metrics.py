@@ -0,0 +1,39 @@
+"""Простые внутрипроцессные метрики: счётчики и распределения."""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_observations = {}
+
+
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name, value):
+    """Добавляет значение в распределение name (count/sum/max)."""
+    with _lock:
+        stats = _observations.setdefault(
+            name, {'count': 0, 'sum': 0, 'max': 0}
+        )
+        stats['count'] += 1
+        stats['sum'] += value
+        stats['max'] = max(stats['max'], value)
+
+
+def snapshot():
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'observations': {
+                name: dict(stats) for name, stats in _observations.items()
+            },
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _observations.clear()
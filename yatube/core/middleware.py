@@ -0,0 +1,156 @@
+import gzip
+import hashlib
+import struct
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+from .files import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSORS = {
+    'gzip': lambda content: gzip.compress(content, compresslevel=6),
+}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda content: brotli.compress(content, quality=5)
+
+COMPRESSED_CACHE_KEY = 'compressed:{}:{}'
+
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+
+def deflate_part(data, mode=zlib.Z_FULL_FLUSH):
+    """Сжимает кусок в отдельные блоки deflate.
+
+    После Z_FULL_FLUSH поток выровнен по байту и не ссылается на
+    предыдущие данные, поэтому такие куски можно склеивать.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(mode)
+
+
+def gzip_parts(content, compressed_static, dynamic):
+    """Собирает gzip-поток из заранее сжатых общих кусков и дырок."""
+    chunks = [GZIP_HEADER]
+    for index, static in enumerate(compressed_static):
+        chunks.append(static)
+        if index < len(dynamic):
+            chunks.append(deflate_part(dynamic[index]))
+    chunks.append(deflate_part(b'', zlib.Z_FINISH))
+    chunks.append(struct.pack('<II', zlib.crc32(content),
+                              len(content) & 0xffffffff))
+    return b''.join(chunks)
+
+
+class CpuBudget:
+    """Сколько секунд процессора в секунду можно тратить на сжатие."""
+
+    def __init__(self, share, burst=1.0):
+        self.share = share
+        self.burst = burst
+        self.allowance = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def available(self):
+        with self.lock:
+            now = time.monotonic()
+            self.allowance = min(
+                self.burst,
+                self.allowance + (now - self.updated) * self.share
+            )
+            self.updated = now
+            return self.allowance > 0
+
+    def spend(self, seconds):
+        with self.lock:
+            self.allowance -= seconds
+
+
+class CompressionMiddleware:
+    """Сжимает ответы gzip или brotli и кэширует сжатые тела.
+
+    У страниц из core.pagecache общие куски сжимаются один раз и
+    хранятся под ключом страницы, а при выдаче дожимаются только дырки
+    текущего пользователя. Прочие ответы кэшируются по хэшу тела. Если
+    бюджет процессора на сжатие исчерпан, ответ уходит как есть.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.budget = CpuBudget(settings.COMPRESSION_CPU_BUDGET)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request)
+        parts = getattr(response, 'compressible_parts', None)
+        if parts is not None and 'gzip' in accepted:
+            encoding = 'gzip'
+            compressed = self.compress_parts(response.content, *parts)
+        else:
+            encoding = next(
+                (name for name in ('br', 'gzip')
+                 if name in accepted and name in COMPRESSORS),
+                None
+            )
+            if encoding is None:
+                return response
+            compressed = self.compress(response.content, encoding)
+        if compressed is None or len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        return response
+
+    def compress(self, content, encoding):
+        key = COMPRESSED_CACHE_KEY.format(
+            encoding, hashlib.sha1(content).hexdigest()
+        )
+        compressed = cache.get(key)
+        if compressed is not None:
+            metrics.increment('compression.cache_hits')
+            return compressed
+        if not self.budget.available():
+            metrics.increment('compression.over_budget')
+            return None
+        started = time.process_time()
+        compressed = COMPRESSORS[encoding](content)
+        self.budget.spend(time.process_time() - started)
+        metrics.increment('compression.cache_misses')
+        cache.set(key, compressed, settings.COMPRESSION_CACHE_TIMEOUT)
+        return compressed
+
+    def compress_parts(self, content, page_key, parts):
+        key = COMPRESSED_CACHE_KEY.format('gzip-parts', page_key)
+        compressed_static = cache.get(key)
+        if compressed_static is not None:
+            metrics.increment('compression.cache_hits')
+        elif not self.budget.available():
+            metrics.increment('compression.over_budget')
+            return None
+        started = time.process_time()
+        if compressed_static is None:
+            compressed_static = [deflate_part(part) for part in parts[::2]]
+            metrics.increment('compression.cache_misses')
+            cache.set(key, compressed_static,
+                      settings.COMPRESSION_CACHE_TIMEOUT)
+        compressed = gzip_parts(content, compressed_static, parts[1::2])
+        self.budget.spend(time.process_time() - started)
+        return compressed
@@ -1,12 +1,47 @@
 from django.db import models
 
+from .compression import compress, decompress, is_compressed
+
 
 class CreatedModel(models.Model):
     """Абстрактная модель. Добавляет дату создания."""
     created = models.DateTimeField(
         'Дата создания',
-        auto_now_add=True
+        auto_now_add=True,
+        db_index=True
     )
 
     class Meta:
         abstract = True
+
+
+class CompressedTextMixin:
+    """Хранит поля из compressed_fields сжатыми (см. core.compression).
+
+    Поля остаются обычными TextField: значение сжимается на время
+    save() и распаковывается при загрузке из базы, поэтому формы,
+    шаблоны и админка видят исходный текст. Только сигналы pre_save и
+    post_save видят сжатое значение, а искать подстроку в таких полях
+    нужно через compression.filter_contains.
+    """
+    compressed_fields = ('text',)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        for name in cls.compressed_fields:
+            value = instance.__dict__.get(name)
+            if is_compressed(value):
+                instance.__dict__[name] = decompress(value)
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = self.__dict__
+        texts = {name: loaded[name] for name in self.compressed_fields
+                 if isinstance(loaded.get(name), str)}
+        for name, text in texts.items():
+            loaded[name] = compress(text)
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            loaded.update(texts)
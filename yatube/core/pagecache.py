@@ -0,0 +1,179 @@
+"""Кэш страниц для вошедших пользователей с «дырками».
+
+Общая для всех часть страницы рендерится один раз и хранится в кэше,
+а персональные куски (шапка, кнопка подписки, ссылка на редактирование)
+выводятся тегом {% hole %}. При сохранении страницы вместо них
+остаются метки, которые при каждой выдаче заменяются результатом
+небольшого шаблона, отрисованного для текущего пользователя. CSRF-токен
+подставляется так же.
+
+Отданный из кэша ответ помечается атрибутом compressible_parts: ключом
+страницы и кусками тела, чтобы core.middleware сжимал общие куски один
+раз, а не каждую выдачу заново.
+
+Кэш страниц сбрасывается целиком сменой поколения (invalidate_pages),
+её вызывают сигналы при изменении постов, комментариев и групп.
+"""
+import hashlib
+import json
+import re
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.translation import get_language
+
+from . import metrics
+
+PAGE_CACHE_KEY = 'pages:{}:{}:{}'
+
+PAGE_GENERATION_KEY = 'pages:generation'
+
+HOLE_MARKER = '<!--hole:{}:{}-->'
+
+HOLE_RE = re.compile(r'<!--hole:([\w.]+):(\{.*?\})-->')
+
+CSRF_MARKER = '<!--hole:csrf-->'
+
+PARTS_RE = re.compile(HOLE_RE.pattern + '|' + re.escape(CSRF_MARKER))
+
+CSRF_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+_holes = {}
+
+
+def hole(name, template_name):
+    """Регистрирует дырку name.
+
+    Функция получает request и аргументы тега {% hole %} и возвращает
+    контекст для шаблона template_name.
+    """
+    def register(func):
+        _holes[name] = (func, template_name)
+        return func
+    return register
+
+
+def render_hole(request, name, kwargs):
+    func, template_name = _holes[name]
+    return render_to_string(template_name, func(request, **kwargs), request)
+
+
+def punching(request):
+    return getattr(request, '_punch_holes', False)
+
+
+def marker(name, kwargs):
+    return HOLE_MARKER.format(name, json.dumps(kwargs, sort_keys=True))
+
+
+def fill_parts(request, body):
+    """Делит сохранённую страницу на общие куски и дырки пользователя.
+
+    Общие куски стоят на чётных местах списка, заполненные для
+    текущего пользователя дырки - на нечётных.
+    """
+    parts = []
+    position = 0
+    for match in PARTS_RE.finditer(body):
+        parts.append(body[position:match.start()])
+        if match.group(1) is None:
+            parts.append(get_token(request))
+        else:
+            parts.append(render_hole(request, match.group(1),
+                                     json.loads(match.group(2))))
+        position = match.end()
+    parts.append(body[position:])
+    return parts
+
+
+def fill(request, body):
+    """Заполняет дырки сохранённой страницы для текущего пользователя."""
+    return ''.join(fill_parts(request, body))
+
+
+def fill_response(response, request, key, body):
+    parts = [part.encode(response.charset)
+             for part in fill_parts(request, body)]
+    response.content = b''.join(parts)
+    response.compressible_parts = (key, parts)
+    return response
+
+
+def generation():
+    current = cache.get(PAGE_GENERATION_KEY)
+    if current is None:
+        current = uuid.uuid4().hex
+        if not cache.add(PAGE_GENERATION_KEY, current, None):
+            current = cache.get(PAGE_GENERATION_KEY)
+    return current
+
+
+def invalidate_pages():
+    cache.set(PAGE_GENERATION_KEY, uuid.uuid4().hex, None)
+
+
+def page_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_CACHE_KEY.format(generation(), path, get_language())
+
+
+def finish(response):
+    patch_vary_headers(response, ('Cookie',))
+    patch_cache_control(response, private=True)
+    return response
+
+
+def cache_page_with_holes(timeout=None, bypass=None):
+    """Кэширует GET-страницу вошедшего пользователя без его данных.
+
+    bypass(request) может запретить кэш для конкретного запроса.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method != 'GET'
+                    or not request.user.is_authenticated
+                    or (bypass and bypass(request))):
+                return view(request, *args, **kwargs)
+            key = page_key(request)
+            cached = cache.get(key)
+            if cached is not None:
+                metrics.increment('pages.hits')
+                body, content_type = cached
+                return finish(fill_response(
+                    HttpResponse(content_type=content_type),
+                    request, key, body
+                ))
+            metrics.increment('pages.misses')
+            request._punch_holes = True
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                request._punch_holes = False
+            if response.streaming:
+                return response
+            body = response.content.decode(response.charset)
+            if response.status_code == 200 and not response.cookies:
+                body = CSRF_RE.sub(r'\1' + CSRF_MARKER + r'\2', body)
+                cache.set(
+                    key,
+                    (body, response['Content-Type']),
+                    settings.PAGE_CACHE_TIMEOUT if timeout is None
+                    else timeout
+                )
+                return finish(fill_response(response, request, key, body))
+            response.content = fill(request, body)
+            return finish(response)
+        return wrapper
+    return decorator
+
+
+@hole('header', 'includes/header.html')
+def header(request):
+    return {}
@@ -0,0 +1,110 @@
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+LOCK_ATTEMPTS = 20
+
+LOCK_WAIT = 0.005
+
+LOCK_TIMEOUT = 1
+
+
+def parse_rate(rate):
+    """Разбирает строку вида '10/m' в пару (запросов, секунд)."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def client_ip(request):
+    """IP клиента с учётом X-Forwarded-For от доверенных прокси.
+
+    Адреса в заголовке просматриваются справа налево: первый адрес не
+    из RATELIMIT_TRUSTED_PROXIES и есть клиент. Заголовку от других
+    адресов не верим - его мог подставить сам клиент.
+    """
+    trusted = settings.RATELIMIT_TRUSTED_PROXIES
+    address = request.META.get('REMOTE_ADDR', '')
+    if address not in trusted:
+        return address
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    for hop in reversed([hop.strip() for hop in forwarded.split(',')]):
+        if not hop:
+            continue
+        address = hop
+        if hop not in trusted:
+            break
+    return address
+
+
+def client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f'ip:{client_ip(request)}'
+
+
+def take_token(key, rate):
+    """Берёт токен из корзины по алгоритму GCRA.
+
+    Корзина вмещает count запросов и пополняется на один каждые
+    period / count секунд. В кэше лежит только теоретическое время
+    следующего запроса (TAT); его чтение и запись идут под короткой
+    блокировкой на cache.add. Возвращает 0, если запрос разрешён,
+    иначе через сколько секунд освободится токен.
+    """
+    capacity, period = parse_rate(rate)
+    interval = period / capacity
+    lock = f'{key}:lock'
+    for _ in range(LOCK_ATTEMPTS):
+        if cache.add(lock, True, LOCK_TIMEOUT):
+            break
+        time.sleep(LOCK_WAIT)
+    else:
+        # Блокировку держит параллельный запрос того же клиента.
+        return 1
+    try:
+        now = time.time()
+        tat = max(cache.get(key, now), now)
+        allowed_at = tat + interval - period
+        if now < allowed_at:
+            return max(1, math.ceil(allowed_at - now))
+        tat += interval
+        cache.set(key, tat, math.ceil(tat - now))
+        return 0
+    finally:
+        cache.delete(lock)
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse('Слишком много запросов. Попробуйте позже.',
+                            content_type='text/plain; charset=utf-8',
+                            status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(scope, methods=None):
+    """Ограничивает частоту вызова view корзиной токенов (take_token).
+
+    Лимиты задаются в settings.RATELIMITS по имени scope и считаются
+    отдельно для каждого пользователя или IP-адреса.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = settings.RATELIMITS.get(scope)
+            if rate and (methods is None or request.method in methods):
+                retry_after = take_token(
+                    f'ratelimit:{scope}:{client_key(request)}', rate
+                )
+                if retry_after:
+                    return too_many_requests(retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
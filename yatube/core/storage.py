@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, именующее файлы по SHA-256 их содержимого.
+
+    Одинаковые загрузки хранятся одним файлом, а имя файла никогда не
+    меняет содержимое, поэтому его можно кэшировать бессрочно.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.path(directory),
+                                         suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = os.path.join(directory, hexdigest[:2],
+                                hexdigest + extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.remove(temp_path)
+                # Повторная загрузка продлевает защиту от удаления.
+                os.utime(full_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(temp_path, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name.replace('\\', '/')
+
+
+def is_stale(storage, name, grace):
+    """Не менялся ли файл дольше grace секунд."""
+    try:
+        return os.path.getmtime(storage.path(name)) <= time.time() - grace
+    except FileNotFoundError:
+        return False
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Хранилище статики с хэшами в именах и сжатыми копиями файлов.
+
+    При collectstatic рядом с каждым хэшированным файлом кладутся .gz и,
+    если установлен пакет brotli, .br варианты.
+    """
+    compress_min_size = 256
+    compress_skip_extensions = (
+        '.gz', '.br', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico',
+        '.woff', '.woff2', '.zip',
+    )
+
+    def post_process(self, paths, dry_run=False, **options):
+        # Файлы со ссылками на другие файлы проходят несколько проходов
+        # и получают новое имя на каждом; сжимаем только последнее.
+        final_names = {}
+        processed_files = super().post_process(paths, dry_run, **options)
+        for name, hashed_name, processed in processed_files:
+            if hashed_name and not isinstance(processed, Exception):
+                final_names[name] = hashed_name
+            yield name, hashed_name, processed
+        if not dry_run:
+            for hashed_name in final_names.values():
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        if name.lower().endswith(self.compress_skip_extensions):
+            return
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            content = source.read()
+        if len(content) < self.compress_min_size:
+            return
+        compressed = {'.gz': gzip.compress(content, compresslevel=9)}
+        if brotli is not None:
+            compressed['.br'] = brotli.compress(content)
+        for suffix, data in compressed.items():
+            if len(data) < len(content):
+                with open(path + suffix, 'wb') as target:
+                    target.write(data)
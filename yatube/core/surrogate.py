@@ -0,0 +1,100 @@
+"""Метки Surrogate-Key для кэширующего прокси и их сброс.
+
+View добавляет метки страницы через tag(request, ...), декоратор
+cache_in_proxy выставляет Surrogate-Key и s-maxage для анонимных
+ответов. purge(...) копит метки до конца транзакции и отдаёт их
+PurgeDispatcher, который отправляет их на SURROGATE_PURGE_URL пачками
+без повторов.
+"""
+import logging
+import threading
+from functools import wraps
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def tag(request, *keys):
+    """Добавляет метки к ответу на request."""
+    if not hasattr(request, 'surrogate_keys'):
+        request.surrogate_keys = set()
+    request.surrogate_keys.update(keys)
+
+
+def cache_in_proxy(view):
+    """Разрешает прокси кэшировать анонимный ответ view по меткам."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        keys = getattr(request, 'surrogate_keys', ())
+        if (request.method in ('GET', 'HEAD')
+                and response.status_code == 200
+                and not request.user.is_authenticated
+                and not response.cookies and keys):
+            response['Surrogate-Key'] = ' '.join(sorted(keys))
+            patch_cache_control(response, public=True, max_age=0,
+                                s_maxage=settings.SURROGATE_MAX_AGE)
+        else:
+            patch_cache_control(response, private=True)
+        return response
+    return wrapper
+
+
+class PurgeDispatcher:
+    """Копит метки и отправляет их прокси пачками из фонового таймера."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.timer = None
+
+    def schedule(self, keys):
+        delay = settings.SURROGATE_PURGE_DELAY
+        with self.lock:
+            self.pending.update(keys)
+            if delay and self.timer is None:
+                self.timer = threading.Timer(delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        if not delay:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            keys, self.pending = sorted(self.pending), set()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        size = settings.SURROGATE_PURGE_BATCH
+        for start in range(0, len(keys), size):
+            self.send(keys[start:start + size])
+
+    def send(self, keys):
+        try:
+            response = requests.post(
+                settings.SURROGATE_PURGE_URL,
+                headers={'Surrogate-Key': ' '.join(keys)},
+                timeout=settings.SURROGATE_PURGE_TIMEOUT
+            )
+            response.raise_for_status()
+        except requests.RequestException:
+            metrics.increment('surrogate.purge_errors')
+            logger.exception('Не удалось сбросить метки %s', keys)
+        else:
+            metrics.increment('surrogate.purged_keys', len(keys))
+
+
+dispatcher = PurgeDispatcher()
+
+
+def purge(*keys):
+    """Сбрасывает в прокси страницы с метками keys после коммита."""
+    if not settings.SURROGATE_PURGE_URL or not keys:
+        return
+    transaction.on_commit(lambda: dispatcher.schedule(keys))
@@ -0,0 +1,71 @@
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from core.cache import get_or_set
+
+register = template.Library()
+
+
+class GuardedCacheNode(CacheNode):
+    """{% cache %}, защищённый от одновременного пересчёта фрагмента."""
+
+    def resolve(self, var, context):
+        try:
+            return var.resolve(context)
+        except template.VariableDoesNotExist:
+            raise template.TemplateSyntaxError(
+                f'"guarded_cache" tag got an unknown variable: {var.var!r}')
+
+    def render(self, context):
+        expire_time = self.resolve(self.expire_time_var, context)
+        if expire_time is not None:
+            try:
+                expire_time = int(expire_time)
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError(
+                    '"guarded_cache" tag got a non-integer timeout value: '
+                    f'{expire_time!r}')
+        if self.cache_name:
+            cache_name = self.resolve(self.cache_name, context)
+            try:
+                fragment_cache = caches[cache_name]
+            except InvalidCacheBackendError:
+                raise template.TemplateSyntaxError(
+                    'Invalid cache name specified for guarded_cache tag: '
+                    f'{cache_name!r}')
+        else:
+            try:
+                fragment_cache = caches['template_fragments']
+            except InvalidCacheBackendError:
+                fragment_cache = caches['default']
+        vary_on = [self.resolve(var, context) for var in self.vary_on]
+        return get_or_set(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            expire_time,
+            cache=fragment_cache
+        )
+
+
+@register.tag('guarded_cache')
+def do_guarded_cache(parser, token):
+    """Синтаксис как у {% cache %}, закрывается {% endguarded_cache %}."""
+    nodelist = parser.parse(('endguarded_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 2 arguments.")
+    if len(tokens) > 3 and tokens[-1].startswith('using='):
+        cache_name = parser.compile_filter(tokens[-1][len('using='):])
+        tokens = tokens[:-1]
+    else:
+        cache_name = None
+    return GuardedCacheNode(
+        nodelist, parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(bit) for bit in tokens[3:]],
+        cache_name,
+    )
@@ -0,0 +1,15 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.pagecache import marker, punching, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **kwargs):
+    """Персональный кусок страницы, см. core.pagecache."""
+    request = context['request']
+    if punching(request):
+        return mark_safe(marker(name, kwargs))
+    return mark_safe(render_hole(request, name, kwargs))
@@ -0,0 +1,58 @@
+import time
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import SimpleTestCase
+
+from .. import metrics
+from ..cache import LOCK_KEY, get_or_set, should_refresh
+
+
+class GetOrSetTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+    def test_value_computed_once(self):
+        """Значение вычисляется один раз и дальше берётся из кэша."""
+        self.assertEqual(get_or_set('key', self.compute, 60), 'значение 1')
+        self.assertEqual(get_or_set('key', self.compute, 60), 'значение 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой воркер пересчитывает, отдаётся устаревшее значение."""
+        cache.set('key', ('старое', time.time() - 1, 0.1), 60)
+        cache.add(LOCK_KEY.format('key'), 1)
+        self.assertEqual(get_or_set('key', self.compute, 60), 'старое')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(metrics.snapshot()['counters']['cache.stale_hits'],
+                         1)
+
+    def test_expired_value_recomputed_by_lock_holder(self):
+        """Истёкшее значение пересчитывает воркер, взявший блокировку."""
+        cache.set('key', ('старое', time.time() - 1, 0.1), 60)
+        self.assertEqual(get_or_set('key', self.compute, 60), 'значение 1')
+        self.assertIsNone(cache.get(LOCK_KEY.format('key')))
+
+    def test_early_refresh_near_expiry_only(self):
+        """Ранний пересчёт не срабатывает задолго до истечения срока."""
+        now = time.time()
+        self.assertFalse(should_refresh(now + 3600, 0.01, now, 1.0))
+        self.assertTrue(should_refresh(now - 1, 0.01, now, 1.0))
+
+    def test_guarded_cache_tag(self):
+        """Тег guarded_cache кэширует фрагмент как {% cache %}."""
+        template = Template(
+            '{% load guarded_cache %}'
+            '{% guarded_cache 20 fragment page %}{{ value }}'
+            '{% endguarded_cache %}'
+        )
+        first = template.render(Context({'value': 'a', 'page': 1}))
+        second = template.render(Context({'value': 'b', 'page': 1}))
+        other_page = template.render(Context({'value': 'c', 'page': 2}))
+        self.assertEqual((first, second, other_page), ('a', 'a', 'c'))
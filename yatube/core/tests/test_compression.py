@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from ..compression import (MARKER, compress, decompress, is_compressed,
+                           load_dictionary)
+
+LONG_TEXT = 'Длинный пост о погоде в Москве и области. ' * 100
+
+
+def make_dictionary(test, data):
+    fd, path = tempfile.mkstemp()
+    test.addCleanup(os.remove, path)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data.encode())
+    return path
+
+
+class CompressionTest(SimpleTestCase):
+    def test_long_text_compressed(self):
+        """Длинный текст сжимается и восстанавливается без потерь."""
+        stored = compress(LONG_TEXT)
+        self.assertTrue(is_compressed(stored))
+        self.assertLess(len(stored), len(LONG_TEXT.encode()) / 4)
+        self.assertEqual(decompress(stored), LONG_TEXT)
+
+    def test_short_and_marker_texts(self):
+        """Короткий текст хранится как есть, похожий на сжатый - сжатым."""
+        self.assertEqual(compress('Короткий пост'), 'Короткий пост')
+        self.assertEqual(decompress('Короткий пост'), 'Короткий пост')
+        tricky = MARKER + 'не сжатый текст'
+        self.assertTrue(is_compressed(compress(tricky)))
+        self.assertEqual(decompress(compress(tricky)), tricky)
+
+    def test_dictionary(self):
+        """Текст со словарём читается только с тем же словарём."""
+        path = make_dictionary(self, LONG_TEXT[:200])
+        self.addCleanup(load_dictionary.cache_clear)
+        with override_settings(TEXT_COMPRESSION_DICTIONARY=path):
+            stored = compress(LONG_TEXT)
+            self.assertTrue(stored.startswith(MARKER + load_dictionary(
+                path)[0]))
+            self.assertEqual(decompress(stored), LONG_TEXT)
+        with self.assertRaises(ImproperlyConfigured):
+            decompress(stored)
+
+    def test_old_dictionary_still_readable(self):
+        """После смены словаря строки читаются старым из настроек."""
+        old = make_dictionary(self, LONG_TEXT[:200])
+        new = make_dictionary(self, LONG_TEXT[:100])
+        self.addCleanup(load_dictionary.cache_clear)
+        with override_settings(TEXT_COMPRESSION_DICTIONARY=old):
+            stored = compress(LONG_TEXT)
+        old_id = load_dictionary(old)[0]
+        with override_settings(TEXT_COMPRESSION_DICTIONARY=new,
+                               TEXT_COMPRESSION_DICTIONARIES={old_id: old}):
+            self.assertEqual(decompress(stored), LONG_TEXT)
+            recompressed = compress(decompress(stored))
+            self.assertTrue(recompressed.startswith(
+                MARKER + load_dictionary(new)[0]))
+        with override_settings(TEXT_COMPRESSION_DICTIONARY=new,
+                               TEXT_COMPRESSION_DICTIONARIES={old_id: new}):
+            with self.assertRaises(ImproperlyConfigured):
+                decompress(stored)
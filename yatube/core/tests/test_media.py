@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class MediaServingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in ('posts/photo.jpg', 'cache/ab/cd/thumb.jpg'):
+            os.makedirs(os.path.dirname(os.path.join(MEDIA_ROOT, name)),
+                        exist_ok=True)
+            with open(os.path.join(MEDIA_ROOT, name), 'wb') as f:
+                f.write(bytes(range(100)))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_range_and_conditional_requests(self):
+        """Файл отдаётся по частям и подтверждается по ETag."""
+        response = self.client.get('/media/posts/photo.jpg',
+                                   HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content),
+                         bytes(range(10, 20)))
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        etag = response['ETag']
+        response = self.client.get('/media/posts/photo.jpg',
+                                   HTTP_RANGE='bytes=-5', HTTP_IF_RANGE=etag)
+        self.assertEqual(b''.join(response.streaming_content),
+                         bytes(range(95, 100)))
+        response = self.client.get('/media/posts/photo.jpg',
+                                   HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+        response = self.client.get('/media/posts/photo.jpg',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_thumbnails_immutable(self):
+        """Миниатюры кэшируются бессрочно, исходные файлы - нет."""
+        response = self.client.get('/media/cache/ab/cd/thumb.jpg')
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+        response = self.client.get('/media/posts/photo.jpg')
+        self.assertFalse(response.has_header('Cache-Control'))
+        response.close()
+
+    @override_settings(FILES_SENDFILE='x-accel-redirect')
+    def test_sendfile_offload(self):
+        """При включённом sendfile файл отдаёт веб-сервер."""
+        response = self.client.get('/media/posts/photo.jpg')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/posts/photo.jpg')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response.content, b'')
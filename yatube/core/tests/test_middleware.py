@@ -0,0 +1,52 @@
+import gzip
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import metrics
+
+User = get_user_model()
+
+
+class CompressionMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def test_response_compressed_once(self):
+        """Ответ сжимается gzip, повторное сжатие берётся из кэша."""
+        first = self.client.get('/about/author/', HTTP_ACCEPT_ENCODING='gzip')
+        second = self.client.get('/about/author/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(second.content),
+                         gzip.decompress(first.content))
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters['compression.cache_misses'], 1)
+        self.assertEqual(counters['compression.cache_hits'], 1)
+
+    def test_response_not_compressed_without_accept_encoding(self):
+        """Без Accept-Encoding ответ не сжимается."""
+        response = self.client.get('/about/author/')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_personal_pages_reuse_compressed_parts(self):
+        """Общие куски страниц вошедших сжимаются один раз на всех."""
+        url = reverse('posts:index')
+        pages = []
+        for username in ('first', 'second'):
+            client = Client()
+            client.force_login(User.objects.create_user(username=username))
+            plain = client.get(url).content
+            response = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            body = gzip.decompress(response.content)
+            self.assertEqual(len(body), len(plain))
+            pages.append(body.decode())
+        self.assertIn('first', pages[0])
+        self.assertIn('second', pages[1])
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters['compression.cache_misses'], 1)
+        self.assertEqual(counters['compression.cache_hits'], 1)
@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from ..ratelimit import client_ip, take_token
+
+
+class TakeTokenTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_refills_gradually(self):
+        """После исчерпания корзины токен возвращается через period/count."""
+        with mock.patch('core.ratelimit.time.time', return_value=1000.0):
+            for _ in range(5):
+                self.assertEqual(take_token('test', '5/h'), 0)
+            self.assertEqual(take_token('test', '5/h'), 12 * 60)
+        with mock.patch('core.ratelimit.time.time',
+                        return_value=1000.0 + 12 * 60):
+            self.assertEqual(take_token('test', '5/h'), 0)
+            self.assertTrue(take_token('test', '5/h'))
+
+    def test_no_double_burst(self):
+        """Исчерпанная корзина не наполняется заново на границе периода."""
+        with mock.patch('core.ratelimit.time.time', return_value=59.0):
+            for _ in range(10):
+                self.assertEqual(take_token('test', '10/m'), 0)
+        with mock.patch('core.ratelimit.time.time', return_value=61.0):
+            self.assertEqual(take_token('test', '10/m'), 4)
+
+
+class ClientIpTest(SimpleTestCase):
+    factory = RequestFactory()
+
+    def test_forwarded_for_ignored_from_unknown_address(self):
+        """Заголовок от недоверенного адреса не учитывается."""
+        request = self.factory.get('/', REMOTE_ADDR='203.0.113.5',
+                                   HTTP_X_FORWARDED_FOR='198.51.100.1')
+        self.assertEqual(client_ip(request), '203.0.113.5')
+
+    @override_settings(RATELIMIT_TRUSTED_PROXIES=['10.0.0.1', '10.0.0.2'])
+    def test_client_behind_trusted_proxies(self):
+        """За доверенными прокси клиент - крайний правый чужой адрес."""
+        request = self.factory.get(
+            '/', REMOTE_ADDR='10.0.0.1',
+            HTTP_X_FORWARDED_FOR='1.2.3.4, 198.51.100.1, 10.0.0.2')
+        self.assertEqual(client_ip(request), '198.51.100.1')
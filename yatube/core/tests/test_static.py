@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..storage import CompressedManifestStaticFilesStorage
+from ..views import serve_static
+
+STATIC_SOURCE = tempfile.mkdtemp()
+STATIC_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    STATICFILES_DIRS=(STATIC_SOURCE,),
+    STATIC_ROOT=STATIC_ROOT,
+    STATICFILES_STORAGE='core.storage.CompressedManifestStaticFilesStorage'
+)
+class StaticPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(STATIC_SOURCE, 'css'))
+        with open(os.path.join(STATIC_SOURCE, 'css', 'site.css'), 'w') as f:
+            f.write('body { color: black; }\n' * 100)
+        with open(os.path.join(STATIC_SOURCE, 'css', 'page.css'), 'w') as f:
+            f.write('@import url("site.css");\n')
+            f.write('p { color: gray; }\n' * 100)
+        call_command('collectstatic', interactive=False, stdout=StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(STATIC_SOURCE, ignore_errors=True)
+        shutil.rmtree(STATIC_ROOT, ignore_errors=True)
+
+    def hashed_name(self):
+        return staticfiles_storage.stored_name('css/site.css')
+
+    def test_collectstatic_writes_compressed_copies(self):
+        """collectstatic кладёт gzip-копию рядом с хэшированным файлом."""
+        name = self.hashed_name()
+        self.assertNotEqual(name, 'css/site.css')
+        self.assertTrue(
+            os.path.exists(os.path.join(STATIC_ROOT, name + '.gz')))
+
+    def test_each_file_compressed_once(self):
+        """Файлы со ссылками сжимаются один раз, а не на каждом проходе."""
+        with mock.patch.object(CompressedManifestStaticFilesStorage,
+                               'compress') as compress:
+            call_command('collectstatic', interactive=False,
+                         stdout=StringIO())
+        names = [call.args[0] for call in compress.call_args_list]
+        self.assertEqual(sorted(names), sorted(set(names)))
+        self.assertIn(staticfiles_storage.stored_name('css/page.css'), names)
+
+    def test_serve_precompressed_immutable(self):
+        """Хэшированный файл отдаётся сжатым и с бессрочным кэшированием."""
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = serve_static(request, self.hashed_name())
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'text/css')
+        response.close()
+        request = RequestFactory().get('/')
+        response = serve_static(request, 'css/site.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Cache-Control'))
+        response.close()
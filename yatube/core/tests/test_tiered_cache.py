@@ -0,0 +1,102 @@
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from .. import metrics
+from ..tiered_cache import MISSING, LocalStore, TieredCache
+
+
+def make_cache(**options):
+    """Отдельный процесс: свой L1 поверх общего L2."""
+    tiered = TieredCache('shared', {'OPTIONS': {
+        'L1_PREFIXES': ['hot:'], 'GENERATION_CHECK_INTERVAL': 0, **options,
+    }})
+    tiered.l1 = LocalStore(10, 1024)
+    return tiered
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def test_hot_keys_served_from_l1(self):
+        """Повторное чтение горячего ключа не доходит до L2."""
+        tiered = make_cache()
+        tiered.set('hot:key', 'значение')
+        tiered.l2.delete('hot:key')
+        self.assertEqual(tiered.get('hot:key'), 'значение')
+        self.assertEqual(metrics.snapshot()['counters']['cache.l1_hits'], 1)
+
+    def test_cold_keys_bypass_l1(self):
+        """Ключи без настроенного префикса читаются только из L2."""
+        tiered = make_cache()
+        tiered.set('cold:key', 'значение')
+        tiered.l2.delete('cold:key')
+        self.assertIsNone(tiered.get('cold:key'))
+
+    def test_write_in_other_process_invalidates_l1(self):
+        """Запись в другом процессе делает копию в L1 недействительной."""
+        first, second = make_cache(), make_cache()
+        first.set('hot:key', 'старое')
+        self.assertEqual(second.get('hot:key'), 'старое')
+        first.set('hot:key', 'новое')
+        self.assertEqual(second.get('hot:key'), 'новое')
+        first.delete('hot:key')
+        self.assertIsNone(second.get('hot:key'))
+
+    def test_new_keys_keep_other_l1_entries(self):
+        """Запись нового ключа не сбрасывает соседние ключи в L1."""
+        first, second = make_cache(), make_cache()
+        first.set('hot:a', 1)
+        self.assertEqual(second.get('hot:a'), 1)
+        first.set('hot:b', 2)
+        first.add('hot:c', 3)
+        first.l2.delete('hot:a')
+        self.assertEqual(second.get('hot:a'), 1)
+
+    def test_lock_keys_bypass_l1(self):
+        """Ключи блокировок не попадают в L1."""
+        tiered = make_cache()
+        self.assertTrue(tiered.add('hot:key:lock', 1))
+        tiered.l2.delete('hot:key:lock')
+        self.assertIsNone(tiered.get('hot:key:lock'))
+
+    def test_l1_copy_expires_with_l2(self):
+        """Копия из L2 живёт в L1 не дольше самого ключа в L2."""
+        first, second = make_cache(), make_cache()
+        first.set('hot:key', 'значение', timeout=5)
+        before = time.time()
+        self.assertEqual(second.get('hot:key'), 'значение')
+        (_, _, expires), = second.l1.entries.values()
+        self.assertLessEqual(expires, before + 5)
+
+    def test_get_many_mixes_tiers(self):
+        """get_many берёт из L1 что есть, остальное - одним запросом к L2."""
+        tiered = make_cache()
+        tiered.set('hot:a', 1)
+        tiered.l2.set('cold:b', 2)
+        self.assertEqual(tiered.get_many(['hot:a', 'cold:b', 'cold:c']),
+                         {'hot:a': 1, 'cold:b': 2})
+        self.assertEqual(tiered.stats(), {'l1': 1.0, 'l2': 0.5})
+
+    def test_local_store_bounds(self):
+        """L1 вытесняет давно не читанные записи по числу и размеру."""
+        store = LocalStore(max_entries=2, max_bytes=200)
+        store.set('a', 'a', 'g', float('inf'))
+        store.set('b', 'b', 'g', float('inf'))
+        store.get('a', 'g')
+        store.set('c', 'c', 'g', float('inf'))
+        self.assertIs(store.get('b', 'g'), MISSING)
+        self.assertEqual(store.get('a', 'g'), 'a')
+        store.set('big', 'x' * 150, 'g', float('inf'))
+        self.assertLessEqual(store.size, 200)
+        self.assertEqual(store.get('big', 'g'), 'x' * 150)
+        self.assertIs(store.get('c', 'g'), MISSING)
+        store.set('other', 'y' * 150, 'g', float('inf'))
+        self.assertLessEqual(store.size, 200)
+        self.assertIs(store.get('big', 'g'), MISSING)
+        self.assertEqual(store.get('other', 'g'), 'y' * 150)
+        store.set('huge', 'x' * 300, 'g', float('inf'))
+        self.assertIs(store.get('huge', 'g'), MISSING)
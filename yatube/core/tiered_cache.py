@@ -0,0 +1,291 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим кэшем.
+
+L1 хранит только ключи с префиксами из OPTIONS['L1_PREFIXES'] и ограничен
+числом записей и суммарным размером. Согласованность между процессами
+держится на поколениях: у каждого префикса в L2 лежит метка поколения,
+перезапись или удаление ключа пересоздаёт её, а запись в L1
+действительна, пока метка не изменилась. Метки перечитываются не чаще
+раза в GENERATION_CHECK_INTERVAL секунд, поэтому другой процесс может
+видеть старое значение не дольше этого интервала.
+
+Запись отсутствующего в L2 ключа метку не меняет: копия в L1 живёт не
+дольше, чем ключ в L2 (срок хранится в L2 вместе со значением), так что
+действительных старых копий в этот момент ни у кого нет. Ключи
+блокировок (…:lock) в L1 не попадают.
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.tiered_cache.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'L1_PREFIXES': ['template.cache.']},
+        },
+        'shared': {...},
+    }
+"""
+import math
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+GENERATION_KEY = 'tiered:generation:{}'
+
+MISSING = object()
+
+LOCK_SUFFIX = ':lock'
+
+# Горячие ключи лежат в L2 вместе с моментом истечения.
+Envelope = namedtuple('Envelope', 'value expires')
+
+
+class LocalStore:
+    """LRU процесса, общий для всех потоков."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.generations = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, generation):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            pickled, entry_generation, expires = entry
+            if entry_generation != generation or expires < time.time():
+                self._pop(key)
+                return MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, generation, expires):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(pickled) > self.max_bytes:
+            self.delete(key)
+            return
+        with self.lock:
+            self._pop(key)
+            self.entries[key] = (pickled, generation, expires)
+            self.size += len(pickled)
+            while (len(self.entries) > self.max_entries
+                   or self.size > self.max_bytes):
+                self._pop(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            self._pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generations.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l2_alias = location
+        self.prefixes = tuple(options.get('L1_PREFIXES', ()))
+        self.l1_max_age = options.get('L1_MAX_AGE', 60)
+        self.check_interval = options.get('GENERATION_CHECK_INTERVAL', 1)
+        with _stores_lock:
+            self.l1 = _stores.setdefault(location, LocalStore(
+                options.get('L1_MAX_ENTRIES', 500),
+                options.get('L1_MAX_BYTES', 2 * 1024 * 1024)
+            ))
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    def prefix_of(self, key):
+        if key.endswith(LOCK_SUFFIX):
+            return None
+        for prefix in self.prefixes:
+            if key.startswith(prefix):
+                return prefix
+        return None
+
+    def generations(self, prefixes):
+        """Возвращает текущие метки поколений для набора префиксов."""
+        now = time.time()
+        known = self.l1.generations
+        result, stale = {}, []
+        for prefix in prefixes:
+            generation, checked = known.get(prefix, (None, 0))
+            if now - checked < self.check_interval:
+                result[prefix] = generation
+            else:
+                stale.append(prefix)
+        if stale:
+            keys = {GENERATION_KEY.format(prefix): prefix for prefix in stale}
+            found = self.l2.get_many(keys)
+            for key, prefix in keys.items():
+                generation = found.get(key)
+                if generation is None:
+                    generation = uuid.uuid4().hex
+                    if not self.l2.add(key, generation, None):
+                        generation = self.l2.get(key)
+                known[prefix] = (generation, now)
+                result[prefix] = generation
+        return result
+
+    def bump(self, prefix):
+        generation = uuid.uuid4().hex
+        self.l2.set(GENERATION_KEY.format(prefix), generation, None)
+        self.l1.generations[prefix] = (generation, time.time())
+        return generation
+
+    def wrap(self, value, timeout):
+        # Срок считается так же, как его посчитает L2.
+        expires = BaseCache.get_backend_timeout(self.l2, timeout)
+        return Envelope(value, math.inf if expires is None else expires)
+
+    def l1_expires(self, expires):
+        """Срок копии в L1: не дольше L1_MAX_AGE и срока ключа в L2."""
+        return min(time.time() + self.l1_max_age, expires)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        prefixes = {key: self.prefix_of(key) for key in keys}
+        generations = self.generations(
+            {prefix for prefix in prefixes.values() if prefix})
+        result, misses = {}, []
+        for key in keys:
+            prefix = prefixes[key]
+            value = MISSING
+            if prefix:
+                value = self.l1.get(self.make_key(key, version),
+                                    generations[prefix])
+                metrics.increment('cache.l1_misses' if value is MISSING
+                                  else 'cache.l1_hits')
+            if value is MISSING:
+                misses.append(key)
+            else:
+                result[key] = value
+        if not misses:
+            return result
+        found = self.l2.get_many(misses, version=version)
+        if found:
+            metrics.increment('cache.l2_hits', len(found))
+        if len(found) < len(misses):
+            metrics.increment('cache.l2_misses', len(misses) - len(found))
+        for key, value in found.items():
+            prefix = prefixes[key]
+            if prefix and isinstance(value, Envelope):
+                value, expires = value
+                self.l1.set(self.make_key(key, version), value,
+                            generations[prefix], self.l1_expires(expires))
+            result[key] = value
+        return result
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        prefix = self.prefix_of(key)
+        if not prefix:
+            self.l2.set(key, value, timeout, version=version)
+            return
+        entry = self.wrap(value, timeout)
+        if self.l2.add(key, entry, timeout, version=version):
+            generation = self.generations([prefix])[prefix]
+        else:
+            # Ключ был в L2: копии в L1 других процессов устарели.
+            self.l2.set(key, entry, timeout, version=version)
+            generation = self.bump(prefix)
+        self.l1.set(self.make_key(key, version), value, generation,
+                    self.l1_expires(entry.expires))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        cold = {key: value for key, value in data.items()
+                if not self.prefix_of(key)}
+        failed = self.l2.set_many(cold, timeout, version=version)
+        for key, value in data.items():
+            if key not in cold:
+                self.set(key, value, timeout, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        prefix = self.prefix_of(key)
+        if not prefix:
+            return self.l2.add(key, value, timeout, version=version)
+        entry = self.wrap(value, timeout)
+        added = self.l2.add(key, entry, timeout, version=version)
+        if added:
+            self.l1.set(self.make_key(key, version), value,
+                        self.generations([prefix])[prefix],
+                        self.l1_expires(entry.expires))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        # Срок в обёртке горячего ключа остаётся прежним: L1 лишь
+        # раньше перечитает его из L2.
+        return self.l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        if self.prefix_of(key):
+            # В L2 горячий ключ лежит в обёртке, incr бэкенда к нему
+            # неприменим.
+            return super().incr(key, delta, version)
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        if self.prefix_of(key):
+            return super().decr(key, delta, version)
+        return self.l2.decr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        self.l2.delete(key, version=version)
+        self.forget(key, version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.l2.delete_many(keys, version=version)
+        for key in keys:
+            self.forget(key, version)
+
+    def forget(self, key, version):
+        prefix = self.prefix_of(key)
+        if prefix:
+            self.l1.delete(self.make_key(key, version))
+            self.bump(prefix)
+
+    def clear(self):
+        self.l2.clear()
+        self.l1.clear()
+
+    def stats(self):
+        """Доля попаданий по уровням по данным core.metrics."""
+        counters = metrics.snapshot()['counters']
+        ratios = {}
+        for tier in ('l1', 'l2'):
+            hits = counters.get(f'cache.{tier}_hits', 0)
+            total = hits + counters.get(f'cache.{tier}_misses', 0)
+            ratios[tier] = hits / total if total else None
+        return ratios
@@ -1,4 +1,15 @@
+import re
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from .files import serve_file
+from .metrics import snapshot
+
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
 
 
 def page_not_found(request, exception):
@@ -15,3 +26,24 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def metrics(request):
+    return JsonResponse(snapshot())
+
+
+def serve_static(request, path):
+    """Отдаёт собранную статику, если перед сайтом нет веб-сервера."""
+    return serve_file(request, settings.STATIC_ROOT, path,
+                      immutable=bool(HASHED_NAME_RE.search(path)),
+                      precompressed=True)
+
+
+def serve_media(request, path):
+    """Отдаёт загруженные файлы; миниатюры sorl не меняются по имени."""
+    return serve_file(
+        request, settings.MEDIA_ROOT, path,
+        immutable=path.startswith(thumbnail_settings.THUMBNAIL_PREFIX),
+        sendfile=True
+    )
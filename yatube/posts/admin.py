@@ -1,36 +1,179 @@
-from django.contrib import admin
+from core.admin import ScalableModelAdmin
+from core.compression import filter_contains
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 
-from .models import Comment, Follow, Group, Post
+from . import moderation, sharding, tombstones
+from .models import Comment, Follow, Group, Post, Tombstone
 
 
-class CommentAdmin(admin.ModelAdmin):
+class PostActionForm(ActionForm):
+    group_slug = forms.SlugField(label='Группа (slug)', required=False)
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """Список постов или комментариев читает один шард за раз."""
+    title = 'шард'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in sharding.aliases()]
+
+    def value(self):
+        value = super().value()
+        aliases = sharding.aliases()
+        return value if value in aliases else aliases[0]
+
+    def choices(self, changelist):
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == alias,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: alias}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset.using(self.value())
+
+
+class ShardedAdminMixin:
+    """Списки и формы постов и комментариев при шардировании.
+
+    Список показывает один шард (фильтр ShardFilter), связанные
+    объекты из default подгружаются отдельными запросами, а объект
+    для формы ищется во всех шардах.
+    """
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if sharding.enabled():
+            return (ShardFilter, *list_filter)
+        return list_filter
+
+    def get_list_select_related(self, request):
+        if sharding.enabled():
+            # В базе шарда нет таблиц пользователей и групп.
+            return ()
+        return super().get_list_select_related(request)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if sharding.enabled():
+            return queryset.prefetch_related(*self.list_select_related)
+        return queryset
+
+    def get_object(self, request, object_id, from_field=None):
+        if not sharding.enabled():
+            return super().get_object(request, object_id, from_field)
+        queryset = self.get_queryset(request)
+        field = (self.model._meta.pk if from_field is None
+                 else self.model._meta.get_field(from_field))
+        try:
+            object_id = field.to_python(object_id)
+        except (ValidationError, ValueError):
+            return None
+        for posts in sharding.every_shard(queryset):
+            obj = posts.filter(**{field.name: object_id}).first()
+            if obj is not None:
+                return obj
+        return None
+
+
+class CompressedSearchMixin:
+    """Поиск по text, который находит и сжатые длинные тексты.
+
+    Сжатые тексты распаковываются только у ADMIN_SEARCH_DECOMPRESS_LIMIT
+    самых новых строк списка (с учётом фильтров), более старые
+    находятся по несжатому полю search_prefix_field, если оно задано.
+    """
+    search_fields = ('text',)
+    search_prefix_field = None
+
+    def get_search_results(self, request, queryset, search_term):
+        for word in search_term.split():
+            matched = filter_contains(
+                queryset, 'text', word,
+                limit=settings.ADMIN_SEARCH_DECOMPRESS_LIMIT
+            )
+            if self.search_prefix_field:
+                matched = queryset.filter(
+                    Q(pk__in=matched.values('pk'))
+                    | Q(**{f'{self.search_prefix_field}__icontains': word})
+                )
+            queryset = matched
+        return queryset, False
+
+
+class TombstoneDeleteMixin:
+    """Удаление через отметку: зависимые строки удаляет фоновая команда."""
+    tombstone = None
+
+    def get_deleted_objects(self, objs, request):
+        perms_needed = set()
+        if not self.has_delete_permission(request):
+            perms_needed.add(self.opts.verbose_name)
+        return [str(obj) for obj in objs], {}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        self.tombstone(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.tombstone(obj)
+
+
+class CommentAdmin(CompressedSearchMixin, ShardedAdminMixin,
+                   ScalableModelAdmin):
     list_display = (
+        'pk',
         'post',
         'author',
         'text',
+        'created',
     )
+    list_select_related = ('post', 'author')
+    raw_id_fields = ('post', 'author')
+    date_hierarchy = 'created'
+    actions = ('delete_in_bulk',)
     empty_value_display = '-пусто-'
 
+    def delete_in_bulk(self, request, queryset):
+        deleted = moderation.purge_comments(queryset)
+        self.message_user(request, f'Удалено комментариев: {deleted}')
+    delete_in_bulk.short_description = 'Удалить выбранные комментарии пачками'
+
 
-class CommentAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableModelAdmin):
     list_display = (
+        'pk',
         'user',
         'author'
     )
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    cursor_field = None
     empty_value_display = '-пусто-'
 
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(TombstoneDeleteMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'title',
         'slug',
         'description',
     )
+    search_fields = ('title', 'slug')
+    tombstone = staticmethod(tombstones.tombstone_group)
     empty_value_display = '-пусто-'
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(CompressedSearchMixin, ShardedAdminMixin,
+                ScalableModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -39,12 +182,58 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
-    search_fields = ('text',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
+    # Начало длинного текста ищется по анонсу без распаковки.
+    search_prefix_field = 'excerpt'
     list_filter = ('created',)
+    date_hierarchy = 'created'
+    action_form = PostActionForm
+    actions = ('regroup', 'delete_in_bulk', 'purge_comments')
     empty_value_display = '-пусто-'
 
+    def regroup(self, request, queryset):
+        slug = request.POST.get('group_slug')
+        group = None
+        if slug:
+            group = Group.objects.filter(slug=slug).first()
+            if group is None:
+                self.message_user(request, f'Группа {slug} не найдена',
+                                  messages.ERROR)
+                return
+        moved = moderation.regroup_posts(queryset, group)
+        self.message_user(request, f'Перенесено постов: {moved}')
+    regroup.short_description = 'Перенести выбранные посты в группу'
+
+    def delete_in_bulk(self, request, queryset):
+        deleted = moderation.delete_posts(queryset)
+        self.message_user(request, f'Удалено постов: {deleted}')
+    delete_in_bulk.short_description = 'Удалить выбранные посты пачками'
+
+    def purge_comments(self, request, queryset):
+        deleted = moderation.purge_comments(
+            Comment.objects.filter(post__in=queryset)
+        )
+        self.message_user(request, f'Удалено комментариев: {deleted}')
+    purge_comments.short_description = (
+        'Удалить комментарии к выбранным постам'
+    )
+
+
+class TombstoneAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'kind',
+        'object_id',
+        'processed',
+        'created',
+    )
+    list_filter = ('kind',)
+
 
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Post, PostAdmin)
+admin.site.register(Tombstone, TombstoneAdmin)
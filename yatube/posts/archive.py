@@ -0,0 +1,57 @@
+"""Перенос старых постов и комментариев в архивные таблицы.
+
+Ленты читают только горячую таблицу Post, а post_detail и profile
+прозрачно дочитывают архив.
+"""
+from django.db import transaction
+
+from . import moderation, sharding
+from .models import ArchivedComment, ArchivedPost, Comment, Post
+from .signals import bulk_changed
+
+POST_FIELDS = ('id', 'text', 'excerpt', 'excerpt_html', 'excerpt_truncated',
+               'author_id', 'group_id', 'image', 'image_width', 'image_height',
+               'image_color', 'image_placeholder', 'version', 'created')
+
+COMMENT_FIELDS = ('id', 'post_id', 'author_id', 'text', 'created')
+
+
+def archive_posts(before, chunk_size=moderation.CHUNK_SIZE, progress=None):
+    """Переносит в архив посты, созданные раньше before.
+
+    Архив лежит в default, а посты - в шарде автора. Пачка сначала
+    фиксируется в архиве и только потом удаляется из шарда; если
+    удаление не прошло, повторный запуск не создаст дублей в архиве
+    и просто удалит оставшиеся строки.
+    """
+    archived = []
+    group_ids = set()
+    for queryset in sharding.every_shard(
+            Post.objects.filter(created__lt=before)):
+        group_ids.update(
+            queryset.order_by().exclude(group=None)
+            .values_list('group_id', flat=True).distinct()
+        )
+        for ids in moderation.chunked_ids(queryset, chunk_size):
+            with transaction.atomic(using=queryset.db), transaction.atomic():
+                posts = Post.objects.using(queryset.db).filter(pk__in=ids)
+                comments = Comment.objects.using(queryset.db).filter(
+                    post_id__in=ids)
+                ArchivedPost.objects.bulk_create(
+                    (ArchivedPost(**row)
+                     for row in posts.values(*POST_FIELDS)),
+                    ignore_conflicts=True
+                )
+                ArchivedComment.objects.bulk_create(
+                    (ArchivedComment(**row)
+                     for row in comments.values(*COMMENT_FIELDS)),
+                    ignore_conflicts=True
+                )
+                comments._raw_delete(comments.db)
+                posts._raw_delete(posts.db)
+            archived.extend(ids)
+            if progress:
+                progress(len(archived))
+    bulk_changed.send(sender=Post, post_ids=archived, group_ids=group_ids,
+                      author_ids=set())
+    return len(archived)
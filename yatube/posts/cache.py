@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+
+from .models import Group
+
+GROUP_CACHE_KEY = 'posts:group:{}'
+
+
+def get_group_or_404(slug):
+    """Возвращает группу по slug, используя кэш."""
+    key = GROUP_CACHE_KEY.format(slug)
+    group = cache.get(key)
+    if group is None:
+        group = get_object_or_404(Group, slug=slug)
+        cache.set(key, group, settings.GROUP_CACHE_TIMEOUT)
+    return group
+
+
+def invalidate_group(*slugs):
+    cache.delete_many([GROUP_CACHE_KEY.format(slug) for slug in slugs if slug])
@@ -0,0 +1,201 @@
+"""Очередь отложенной записи комментариев.
+
+Провалидированные комментарии складываются в отдельную SQLite-базу,
+а команда ``flush_comments`` пачками переносит их в основную базу.
+"""
+import sqlite3
+import threading
+from collections import defaultdict
+from contextlib import ExitStack, closing
+
+from core.compression import compress
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import AutoField
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import sharding
+from .models import Comment, Post, ShardedId
+from .signals import comments_flushed
+
+User = get_user_model()
+
+SESSION_KEY = 'pending_comments'
+
+CREATE_TABLE = (
+    'CREATE TABLE IF NOT EXISTS comment_queue ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+    'post_id INTEGER NOT NULL, '
+    'author_id INTEGER NOT NULL, '
+    'text TEXT NOT NULL, '
+    'created TEXT)'
+)
+
+
+# Файлы очереди, схема которых уже проверена этим процессом.
+_ready_paths = set()
+_ready_lock = threading.Lock()
+
+
+def _create_schema(connection):
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute(CREATE_TABLE)
+    columns = {row[1] for row in
+               connection.execute('PRAGMA table_info(comment_queue)')}
+    if 'created' not in columns:
+        # Очередь, созданная до появления колонки.
+        connection.execute('ALTER TABLE comment_queue ADD COLUMN created TEXT')
+    connection.commit()
+
+
+def _connect():
+    """Открывает очередь; закрывать соединение должен вызывающий."""
+    path = settings.COMMENTS_QUEUE_PATH
+    connection = sqlite3.connect(path, timeout=10)
+    if path not in _ready_paths:
+        with _ready_lock:
+            if path not in _ready_paths:
+                _create_schema(connection)
+                _ready_paths.add(path)
+    return connection
+
+
+def enqueue(post_id, author_id, text):
+    """Ставит комментарий в очередь и возвращает его номер в ней."""
+    with closing(_connect()) as connection, connection:
+        cursor = connection.execute(
+            'INSERT INTO comment_queue (post_id, author_id, text, created) '
+            'VALUES (?, ?, ?, ?)',
+            (post_id, author_id, text, timezone.now().isoformat())
+        )
+        return cursor.lastrowid
+
+
+def queued_ids(ids):
+    """Возвращает те номера из ids, которые ещё не перенесены в базу."""
+    ids = list(ids)
+    if not ids:
+        return set()
+    with closing(_connect()) as connection, connection:
+        rows = connection.execute(
+            'SELECT id FROM comment_queue WHERE id IN ({})'.format(
+                ','.join('?' * len(ids))),
+            ids
+        )
+        return {row[0] for row in rows}
+
+
+def flush(batch_size=500):
+    """Переносит пачку комментариев из очереди в базу.
+
+    Строки удаляются из очереди в той же транзакции SQLite, которая
+    держит блокировку на запись до коммита основной базы: параллельный
+    flush ждёт её, а при сбое до коммита строки остаются в очереди.
+    Возвращает количество перенесённых комментариев.
+    """
+    connection = _connect()
+    try:
+        connection.execute('BEGIN IMMEDIATE')
+        rows = connection.execute(
+            'DELETE FROM comment_queue WHERE id IN ('
+            'SELECT id FROM comment_queue ORDER BY id LIMIT ?) '
+            'RETURNING post_id, author_id, text, created',
+            (batch_size,)
+        ).fetchall()
+        by_shard = _build_comments(rows)
+        with ExitStack() as stack:
+            for alias, comments in by_shard.items():
+                stack.enter_context(transaction.atomic(using=alias))
+                _insert(comments, alias, batch_size)
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    if not rows:
+        return 0
+    comments = [comment for shard in by_shard.values() for comment in shard]
+    comments_flushed.send(sender=Comment,
+                          post_ids={comment.post_id for comment in comments})
+    return len(comments)
+
+
+def _build_comments(rows):
+    """Комментарии к существующим постам от существующих авторов.
+
+    Возвращает {alias базы поста: список комментариев}.
+    """
+    post_shards = {}
+    for posts in sharding.every_shard(
+            Post.objects.filter(pk__in={row[0] for row in rows})):
+        for pk in posts.values_list('pk', flat=True):
+            post_shards[pk] = posts.db
+    existing_authors = set(User.objects.filter(
+        pk__in={row[1] for row in rows}).values_list('pk', flat=True))
+    now = timezone.now()
+    by_shard = defaultdict(list)
+    for post_id, author_id, text, created in rows:
+        if post_id not in post_shards or author_id not in existing_authors:
+            continue
+        by_shard[post_shards[post_id]].append(
+            # Запись идёт в обход save(), поэтому сжимаем сами.
+            Comment(post_id=post_id, author_id=author_id,
+                    text=compress(text),
+                    created=parse_datetime(created) if created else now)
+        )
+    return by_shard
+
+
+def _insert(comments, using, batch_size):
+    """bulk_create без pre_save: иначе auto_now_add затрёт created."""
+    fields = Comment._meta.concrete_fields
+    if sharding.enabled():
+        # id должен быть уникален во всех шардах, как в allocate_sharded_id.
+        for comment in comments:
+            comment.pk = ShardedId.allocate()
+    else:
+        fields = [field for field in fields
+                  if not isinstance(field, AutoField)]
+    batch_size = min(batch_size, max(
+        connections[using].ops.bulk_batch_size(fields, comments), 1))
+    for start in range(0, len(comments), batch_size):
+        Comment.objects._insert(comments[start:start + batch_size], fields,
+                                raw=True, using=using)
+
+
+def remember_pending(request, queue_id, post_id, text):
+    """Запоминает комментарий в сессии, чтобы автор сразу его увидел."""
+    pending = request.session.get(SESSION_KEY, [])
+    pending.append({
+        'id': queue_id,
+        'post_id': post_id,
+        'text': text,
+        'created': timezone.now().isoformat()
+    })
+    request.session[SESSION_KEY] = pending
+
+
+def has_pending(request):
+    return bool(request.session.get(SESSION_KEY))
+
+
+def pending_comments(request, post):
+    """Возвращает ещё не перенесённые комментарии автора к посту."""
+    pending = request.session.get(SESSION_KEY)
+    if not pending:
+        return []
+    still_queued = queued_ids(item['id'] for item in pending)
+    if len(still_queued) != len(pending):
+        pending = [item for item in pending if item['id'] in still_queued]
+        request.session[SESSION_KEY] = pending
+    return [
+        Comment(post=post,
+                author=request.user,
+                text=item['text'],
+                created=parse_datetime(item['created']))
+        for item in reversed(pending)
+        if item['post_id'] == post.pk
+    ]
@@ -0,0 +1,162 @@
+"""Компактное кэширование лент.
+
+В кэш кладутся не экземпляры Post, а кортежи с фиксированным набором
+полей, упакованные marshal. Из кэша они читаются в лёгкие объекты
+FeedRow, которые шаблоны выводят так же, как посты.
+"""
+import marshal
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.cache import get_or_set
+
+# Меняется при изменении набора полей row_of: входит в ключ кэша,
+# поэтому записи старой схемы просто перестают читаться.
+SCHEMA_VERSION = 7
+
+FEED_CACHE_KEY = 'posts:feed:v{}:{}:{}'
+
+
+class FeedAuthor:
+    __slots__ = ('pk', 'username', 'full_name')
+
+    def __init__(self, pk, username, full_name):
+        self.pk = pk
+        self.username = username
+        self.full_name = full_name
+
+    def get_full_name(self):
+        return self.full_name
+
+    def __str__(self):
+        return self.username
+
+
+class FeedGroup:
+    __slots__ = ('pk', 'slug', 'title')
+
+    def __init__(self, pk, slug, title):
+        self.pk = pk
+        self.slug = slug
+        self.title = title
+
+    def __str__(self):
+        return self.title
+
+
+class FeedRow:
+    """Пост в ленте только для чтения."""
+    __slots__ = ('pk', 'version', 'author', 'group', 'excerpt',
+                 'excerpt_html', 'truncated', 'image', 'image_width',
+                 'image_height', 'image_color', 'image_placeholder',
+                 'created')
+
+    def __init__(self, pk, version, author_id, username, full_name,
+                 group_id, group_slug, group_title, excerpt, excerpt_html,
+                 truncated, image, image_width, image_height, image_color,
+                 image_placeholder, created):
+        self.pk = pk
+        self.version = version
+        self.author = FeedAuthor(author_id, username, full_name)
+        self.group = (FeedGroup(group_id, group_slug, group_title)
+                      if group_slug else None)
+        self.excerpt = excerpt
+        self.excerpt_html = excerpt_html
+        self.truncated = truncated
+        self.image = image
+        self.image_width = image_width
+        self.image_height = image_height
+        self.image_color = image_color
+        self.image_placeholder = image_placeholder
+        self.created = datetime.fromtimestamp(created, timezone.utc)
+
+    @property
+    def id(self):
+        return self.pk
+
+    @property
+    def author_id(self):
+        return self.author.pk
+
+    def __str__(self):
+        return self.excerpt
+
+
+def row_of(post):
+    group = post.group
+    return (
+        post.pk,
+        post.version,
+        post.author_id,
+        post.author.username,
+        post.author.get_full_name(),
+        post.group_id,
+        group.slug if group else '',
+        group.title if group else '',
+        post.excerpt,
+        post.excerpt_html,
+        post.excerpt_truncated,
+        post.image.name or '',
+        post.image_width,
+        post.image_height,
+        post.image_color,
+        post.image_placeholder,
+        post.created.timestamp(),
+    )
+
+
+def dumps(posts):
+    return marshal.dumps(tuple(map(row_of, posts)))
+
+
+def loads(data):
+    return [FeedRow(*row) for row in marshal.loads(data)]
+
+
+class CachedFeed:
+    """Лента для Paginator, страницы которой берутся из кэша.
+
+    Страница хранится как упакованные строки FeedRow, число постов -
+    отдельным ключом. Посты авторов из exclude_authors и групп из
+    exclude_groups отбрасываются уже при чтении, чтобы скрытие не ждало
+    истечения кэша.
+    """
+
+    def __init__(self, name, posts, exclude_authors=(), exclude_groups=(),
+                 timeout=None):
+        self.name = name
+        self.posts = posts
+        self.exclude_authors = exclude_authors
+        self.exclude_groups = exclude_groups
+        self.timeout = (settings.FEED_CACHE_TIMEOUT
+                        if timeout is None else timeout)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = get_or_set(self.key('count'), self.posts.count,
+                                     self.timeout)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def key(self, *parts):
+        return FEED_CACHE_KEY.format(SCHEMA_VERSION, self.name,
+                                     ':'.join(map(str, parts)))
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        rows = loads(get_or_set(
+            self.key('rows', start, stop),
+            lambda: dumps(self.posts[start:stop]),
+            self.timeout
+        ))
+        return [row for row in rows
+                if row.author.pk not in self.exclude_authors
+                and (row.group is None
+                     or row.group.pk not in self.exclude_groups)]
@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Comment, Post
+from .uploads import EMPTY_IMAGE_META, process_upload
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +10,30 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field, message in self.upload_errors.items():
+            if field in self.fields:
+                self.add_error(field, message)
+        return cleaned_data
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image = process_upload(image)
+            meta = image.image_meta
+        elif not image:
+            meta = EMPTY_IMAGE_META
+        else:
+            return image
+        for name, value in meta.items():
+            setattr(self.instance, name, value)
+        return image
+
     def clean_subject(self):
         data = self.cleaned_data['text']
         if data == '':
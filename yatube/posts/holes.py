@@ -0,0 +1,28 @@
+"""Персональные куски страниц постов, см. core.pagecache."""
+from core.pagecache import hole
+from users.cache import get_cached_user
+
+from .models import Follow
+
+
+@hole('profile_heading', 'posts/includes/profile_heading.html')
+def profile_heading(request, author_id):
+    return {'author': get_cached_user(author_id)}
+
+
+@hole('profile_actions', 'posts/includes/profile_actions.html')
+def profile_actions(request, author_id):
+    user = request.user
+    return {
+        'author': get_cached_user(author_id),
+        'following': user.is_authenticated and Follow.objects.filter(
+            user=user, author_id=author_id).exists(),
+    }
+
+
+@hole('edit_link', 'posts/includes/edit_link.html')
+def edit_link(request, post_id, author_id):
+    return {
+        'post_id': post_id,
+        'is_author': request.user.pk == author_id,
+    }
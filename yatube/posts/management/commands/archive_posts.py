@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import moderation
+from posts.archive import archive_posts
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые посты и их комментарии в архивные таблицы.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.POSTS_ARCHIVE_AFTER_DAYS,
+                            help='Архивировать посты старше N дней.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=moderation.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        archived = archive_posts(
+            before, options['chunk_size'],
+            lambda done: self.stdout.write(f'Перенесено: {done}')
+        )
+        self.stdout.write(f'Перенесено постов в архив: {archived}')
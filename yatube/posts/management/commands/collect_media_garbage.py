@@ -0,0 +1,47 @@
+from core.storage import is_stale
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import sharding
+from posts.models import ArchivedPost, Post
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы картинок, на которые не ссылается ни один пост.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.POST_IMAGE_GRACE,
+            help='Не трогать файлы моложе указанного числа секунд.'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def walk(self, storage, directory):
+        directories, files = storage.listdir(directory)
+        for name in files:
+            yield '/'.join((directory, name))
+        for subdirectory in directories:
+            yield from self.walk(storage, '/'.join((directory, subdirectory)))
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+        if not storage.exists(directory):
+            return
+        referenced = set(
+            ArchivedPost.objects.exclude(image='')
+            .values_list('image', flat=True)
+        )
+        for posts in sharding.every_shard(Post.objects.exclude(image='')):
+            referenced.update(posts.values_list('image', flat=True))
+        removed = 0
+        for name in self.walk(storage, directory):
+            if name in referenced:
+                continue
+            if not is_stale(storage, name, options['grace']):
+                continue
+            if not options['dry_run']:
+                storage.delete(name)
+            removed += 1
+        self.stdout.write(f'Удалено файлов: {removed}')
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.compression import decompress, recompress
+from posts.models import ArchivedComment, ArchivedPost, Comment, Post
+
+MODELS = (Post, Comment, ArchivedPost, ArchivedComment)
+
+
+class Command(BaseCommand):
+    help = ('Перекодирует тексты постов и комментариев по текущим '
+            'настройкам сжатия и показывает экономию места.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        databases = settings.POST_SHARDS or ['default']
+        for model in MODELS:
+            for alias in (databases if model in (Post, Comment)
+                          else ['default']):
+                queryset = model.objects.using(alias)
+                raw, before, after = recompress(queryset, 'text',
+                                                options['chunk_size'])
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural} ({alias}): '
+                    f'текст {raw} Б, было {before} Б, стало {after} Б'
+                    + (f' ({after / raw:.0%})' if raw else '')
+                )
+                self.report_read_overhead(queryset)
+
+    def report_read_overhead(self, queryset):
+        values = list(queryset.values_list('text', flat=True)[:1000])
+        if not values:
+            return
+        start = time.monotonic()
+        for value in values:
+            decompress(value)
+        elapsed = time.monotonic() - start
+        self.stdout.write(
+            f'  чтение {len(values)} строк: {elapsed * 1000:.1f} мс'
+        )
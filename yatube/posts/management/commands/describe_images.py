@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from PIL import Image
+
+from posts.models import ArchivedPost, Post
+from posts.uploads import describe_image
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, цвет и превью картинок постов, '
+            'загруженных до появления этих полей.')
+
+    def handle(self, *args, **options):
+        described = 0
+        for model in (Post, ArchivedPost):
+            posts = (model.objects.exclude(image='')
+                     .filter(image_width=None).only('pk', 'image'))
+            # Один файл бывает у нескольких постов, читаем его один раз.
+            names = {}
+            for post in posts.iterator():
+                names.setdefault(post.image.name, []).append(post.pk)
+            for name, pks in names.items():
+                try:
+                    with model.image.field.storage.open(name) as file, \
+                            Image.open(file) as image:
+                        meta = describe_image(image)
+                except (OSError, SyntaxError, ValueError) as error:
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                if model is Post:
+                    # Версия входит в ключ кэша отрисованного поста.
+                    meta['version'] = F('version') + 1
+                model.objects.filter(pk__in=pks).update(**meta)
+                described += len(pks)
+        self.stdout.write(f'Обработано постов: {described}')
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import comment_queue
+
+
+class Command(BaseCommand):
+    help = 'Переносит комментарии из очереди отложенной записи в базу.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Пауза между проходами в секундах; 0 - один проход.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = comment_queue.flush(options['batch_size'])
+            while flushed:
+                self.stdout.write(f'Перенесено комментариев: {flushed}')
+                flushed = comment_queue.flush(options['batch_size'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.compression import filter_contains
+from posts import moderation, sharding
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Массовая модерация: перенос постов в группу, удаление постов '
+            'или их комментариев по автору, датам и тексту.')
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group(required=True)
+        action.add_argument('--delete', action='store_true',
+                            help='Удалить посты.')
+        action.add_argument('--regroup', metavar='SLUG',
+                            help='Перенести посты в группу; "-" - без группы.')
+        action.add_argument('--purge-comments', action='store_true',
+                            help='Удалить комментарии к постам.')
+        parser.add_argument('--author', help='Имя автора.')
+        parser.add_argument('--since', help='Начиная с даты (ГГГГ-ММ-ДД).')
+        parser.add_argument('--until', help='До даты (ГГГГ-ММ-ДД).')
+        parser.add_argument('--text', help='Подстрока текста.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=moderation.CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать затронутые посты.')
+
+    def get_posts(self, options):
+        posts = Post.objects.all()
+        if options['author']:
+            # Пользователи лежат в default, в шардах есть только author_id.
+            author_id = (User.objects.filter(username=options['author'])
+                         .values_list('pk', flat=True).first())
+            if author_id is None:
+                raise CommandError('Автор не найден.')
+            posts = posts.filter(author_id=author_id)
+        if options['since']:
+            posts = posts.filter(
+                created__date__gte=self.parse_date(options['since']))
+        if options['until']:
+            posts = posts.filter(
+                created__date__lt=self.parse_date(options['until']))
+        return posts
+
+    def parse_date(self, value):
+        try:
+            date = parse_date(value)
+        except ValueError:
+            date = None
+        if date is None:
+            raise CommandError(f'Неверная дата: {value}. Формат: ГГГГ-ММ-ДД.')
+        return date
+
+    def get_shards(self, options):
+        shards = sharding.every_shard(self.get_posts(options))
+        if options['text']:
+            # Сжатые тексты проверяются в Python, отдельно в каждом шарде.
+            shards = [filter_contains(posts, 'text', options['text'])
+                      for posts in shards]
+        return shards
+
+    def progress(self, done):
+        self.stdout.write(f'Обработано: {done}')
+
+    def handle(self, *args, **options):
+        # Посты и их комментарии лежат в одном шарде, поэтому каждый
+        # шард модерируется отдельно.
+        shards = self.get_shards(options)
+        if options['dry_run']:
+            total = sum(posts.count() for posts in shards)
+            self.stdout.write(f'Будет затронуто постов: {total}')
+            return
+        chunk_size = options['chunk_size']
+        if options['delete']:
+            done = sum(
+                moderation.delete_posts(posts, chunk_size, self.progress)
+                for posts in shards
+            )
+            self.stdout.write(f'Удалено постов: {done}')
+        elif options['purge_comments']:
+            done = sum(
+                moderation.purge_comments(
+                    Comment.objects.using(posts.db).filter(post__in=posts),
+                    chunk_size, self.progress)
+                for posts in shards
+            )
+            self.stdout.write(f'Удалено комментариев: {done}')
+        else:
+            group = None
+            if options['regroup'] != '-':
+                group = Group.objects.filter(slug=options['regroup']).first()
+                if group is None:
+                    raise CommandError('Группа не найдена.')
+            done = sum(
+                moderation.regroup_posts(posts, group, chunk_size,
+                                         self.progress)
+                for posts in shards
+            )
+            self.stdout.write(f'Перенесено постов: {done}')
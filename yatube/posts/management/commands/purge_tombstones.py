@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import moderation, tombstones
+from posts.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Удаляет отмеченных на удаление пользователей и группы пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int,
+                            default=moderation.CHUNK_SIZE)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Пауза между проходами в секундах; 0 - один проход.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for tombstone in Tombstone.objects.order_by('created'):
+                tombstones.purge(tombstone, options['chunk_size'])
+                self.stdout.write(
+                    f'Удалён объект {tombstone}, '
+                    f'строк: {tombstone.processed}'
+                )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_auto_20220416_1259'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group', verbose_name='Группа')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('last_post', models.DateTimeField(blank=True, null=True, verbose_name='Последняя активность')),
+                ('top_authors', models.CharField(blank=True, max_length=500, verbose_name='Самые активные авторы')),
+            ],
+            options={
+                'verbose_name': 'Статистика группы',
+                'verbose_name_plural': 'Статистика групп',
+            },
+        ),
+    ]
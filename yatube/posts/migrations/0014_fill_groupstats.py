@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, Max
+
+TOP_AUTHORS_COUNT = 3
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    Post = apps.get_model('posts', 'Post')
+    for group in Group.objects.all():
+        posts = Post.objects.filter(group=group)
+        totals = posts.aggregate(posts_count=Count('id'),
+                                 last_post=Max('created'))
+        top_authors = (
+            posts.values('author__username')
+            .annotate(posts_count=Count('id'))
+            .order_by('-posts_count', 'author__username')
+            .values_list('author__username', flat=True)[:TOP_AUTHORS_COUNT]
+        )
+        GroupStats.objects.update_or_create(
+            group=group,
+            defaults={
+                'posts_count': totals['posts_count'],
+                'last_post': totals['last_post'],
+                'top_authors': ','.join(top_authors),
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_groupstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
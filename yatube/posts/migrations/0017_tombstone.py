@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+                ('kind', models.CharField(choices=[('user', 'Пользователь'), ('group', 'Группа')], max_length=10, verbose_name='Тип')),
+                ('object_id', models.PositiveIntegerField(verbose_name='ID объекта')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='Обработано строк')),
+            ],
+            options={
+                'verbose_name': 'Удаляемый объект',
+                'verbose_name_plural': 'Удаляемые объекты',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tombstone',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_tombstone'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardedId',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Id в шардах',
+                'verbose_name_plural': 'Id в шардах',
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:02
+
+from django.db import migrations, models
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
+
+EXCERPT_CHARS = 300
+
+CHUNK_SIZE = 500
+
+
+def fill_excerpts(model_name):
+    def fill(apps, schema_editor):
+        model = apps.get_model('posts', model_name)
+        posts = model.objects.using(schema_editor.connection.alias)
+        changed = []
+        for post in posts.only('pk', 'text').iterator(CHUNK_SIZE):
+            post.excerpt = Truncator(post.text).chars(EXCERPT_CHARS)
+            post.excerpt_html = str(linebreaksbr(post.excerpt))
+            changed.append(post)
+            if len(changed) == CHUNK_SIZE:
+                posts.bulk_update(changed, ['excerpt', 'excerpt_html'])
+                changed = []
+        posts.bulk_update(changed, ['excerpt', 'excerpt_html'])
+    return fill
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedpost',
+            name='excerpt',
+            field=models.CharField(default='', editable=False, max_length=300, verbose_name='Анонс'),
+        ),
+        migrations.AddField(
+            model_name='archivedpost',
+            name='excerpt_html',
+            field=models.TextField(default='', editable=False, verbose_name='HTML анонса'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(default='', editable=False, max_length=300, verbose_name='Анонс'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_html',
+            field=models.TextField(default='', editable=False, verbose_name='HTML анонса'),
+        ),
+        migrations.RunPython(fill_excerpts('Post'), migrations.RunPython.noop,
+                             hints={'model_name': 'post'}),
+        migrations.RunPython(fill_excerpts('ArchivedPost'),
+                             migrations.RunPython.noop,
+                             hints={'model_name': 'archivedpost'}),
+    ]
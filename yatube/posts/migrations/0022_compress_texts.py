@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from core.compression import recompress
+
+
+def compress_texts(model_name):
+    def run(apps, schema_editor):
+        model = apps.get_model('posts', model_name)
+        recompress(model.objects.using(schema_editor.connection.alias),
+                   'text')
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.RunPython(compress_texts(model_name),
+                             migrations.RunPython.noop,
+                             hints={'model_name': model_name.lower()})
+        for model_name in ('Post', 'Comment', 'ArchivedPost',
+                           'ArchivedComment')
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_compress_texts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedpost',
+            name='image_color',
+            field=models.CharField(default='', editable=False, max_length=7, verbose_name='Цвет картинки'),
+        ),
+        migrations.AddField(
+            model_name='archivedpost',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='archivedpost',
+            name='image_placeholder',
+            field=models.TextField(default='', editable=False, verbose_name='Превью картинки'),
+        ),
+        migrations.AddField(
+            model_name='archivedpost',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_color',
+            field=models.CharField(default='', editable=False, max_length=7, verbose_name='Цвет картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(default='', editable=False, verbose_name='Превью картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+    ]
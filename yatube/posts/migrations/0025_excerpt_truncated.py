@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:30
+
+from django.db import migrations, models
+
+from core.compression import decompress
+
+EXCERPT_CHARS = 300
+
+CHUNK_SIZE = 500
+
+
+def fill_truncated(model_name):
+    def fill(apps, schema_editor):
+        model = apps.get_model('posts', model_name)
+        posts = model.objects.using(schema_editor.connection.alias)
+        # Обрезанный анонс всегда заканчивается многоточием.
+        truncated = [
+            pk for pk, text in posts.filter(excerpt__endswith='…')
+            .values_list('pk', 'text').iterator(CHUNK_SIZE)
+            if len(decompress(text)) > EXCERPT_CHARS
+        ]
+        for start in range(0, len(truncated), CHUNK_SIZE):
+            posts.filter(pk__in=truncated[start:start + CHUNK_SIZE]).update(
+                excerpt_truncated=True)
+    return fill
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_archivedpost_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedpost',
+            name='excerpt_truncated',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Анонс обрезан'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_truncated',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Анонс обрезан'),
+        ),
+        migrations.RunPython(fill_truncated('Post'),
+                             migrations.RunPython.noop,
+                             hints={'model_name': 'post'}),
+        migrations.RunPython(fill_truncated('ArchivedPost'),
+                             migrations.RunPython.noop,
+                             hints={'model_name': 'archivedpost'}),
+    ]
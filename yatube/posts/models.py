@@ -1,11 +1,39 @@
-from core.models import CreatedModel
+from core.models import CompressedTextMixin, CreatedModel
+from core.storage import ContentAddressedStorage
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
+
+from .sharding import ShardedQuerySet
 
 User = get_user_model()
 
 DISPLAYED_CHARS = 15
 
+TOP_AUTHORS_COUNT = 3
+
+# Длина анонса поста в лентах.
+EXCERPT_CHARS = 300
+
+
+def excerpt_of(text):
+    """Возвращает анонс текста, его HTML и признак, что текст обрезан."""
+    excerpt = Truncator(text).chars(EXCERPT_CHARS)
+    return (excerpt, str(linebreaksbr(excerpt, autoescape=True)),
+            len(text) > EXCERPT_CHARS)
+
+
+class ExcerptMixin:
+    """Общее для постов с анонсом: ленты читают его вместо text."""
+
+    @property
+    def truncated(self):
+        return self.excerpt_truncated
+
+    def __str__(self):
+        return (self.excerpt or self.text)[:DISPLAYED_CHARS]
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Название группы')
@@ -21,7 +49,7 @@ class Group(models.Model):
         return self.title
 
 
-class Post(CreatedModel):
+class Post(ExcerptMixin, CompressedTextMixin, CreatedModel):
     text = models.TextField(verbose_name='Текст',
                             help_text='Введите текст поста')
     author = models.ForeignKey(
@@ -42,19 +70,59 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # Увеличивается при каждом изменении, входит в ключ кэша
+    # отрисованного поста (см. posts.snippets).
+    version = models.PositiveIntegerField('Версия', default=1,
+                                          editable=False)
+    # Считаются из text при сохранении, чтобы ленты могли не читать
+    # полный текст (defer('text')).
+    excerpt = models.CharField('Анонс', max_length=EXCERPT_CHARS,
+                               default='', editable=False)
+    excerpt_html = models.TextField('HTML анонса', default='',
+                                    editable=False)
+    # Текст может сам заканчиваться многоточием, поэтому признак
+    # обрезки хранится отдельно.
+    excerpt_truncated = models.BooleanField('Анонс обрезан', default=False,
+                                            editable=False)
+    # Заполняются при загрузке картинки (posts.uploads.describe_image),
+    # чтобы ленты выводили размеры и заглушку без чтения файла.
+    image_width = models.PositiveIntegerField('Ширина картинки', null=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField('Высота картинки', null=True,
+                                               editable=False)
+    image_color = models.CharField('Цвет картинки', max_length=7,
+                                   default='', editable=False)
+    image_placeholder = models.TextField('Превью картинки', default='',
+                                         editable=False)
+
+    objects = ShardedQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
-    def __str__(self):
-        return self.text[:DISPLAYED_CHARS]
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not self._state.adding:
+            # Версию увеличивает сигнал pre_save, она должна попасть
+            # в базу при любом наборе полей.
+            update_fields = kwargs['update_fields'] = {*update_fields,
+                                                       'version'}
+        if update_fields is None or 'text' in update_fields:
+            (self.excerpt, self.excerpt_html,
+             self.excerpt_truncated) = excerpt_of(self.text)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'excerpt',
+                                           'excerpt_html',
+                                           'excerpt_truncated'}
+        super().save(*args, **kwargs)
 
 
-class Comment(CreatedModel):
+class Comment(CompressedTextMixin, CreatedModel):
     post = models.ForeignKey(
         'Post',
         on_delete=models.CASCADE,
@@ -69,6 +137,8 @@ class Comment(CreatedModel):
     text = models.TextField(verbose_name='Текст комментария',
                             help_text='Введите текст поста')
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created']
         verbose_name = 'Комментарий'
@@ -78,6 +148,83 @@ class Comment(CreatedModel):
         return self.text[:DISPLAYED_CHARS]
 
 
+class ArchivedPost(ExcerptMixin, CompressedTextMixin, models.Model):
+    """Старый пост, перенесённый из горячей таблицы командой archive_posts.
+
+    Сохраняет id исходного поста, поэтому ссылки на него не меняются.
+    """
+    id = models.PositiveIntegerField(primary_key=True)
+    text = models.TextField(verbose_name='Текст')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+        verbose_name='Имя автора'
+    )
+    group = models.ForeignKey(
+        'Group',
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='archived_posts',
+        verbose_name='Группа'
+    )
+    image = models.ImageField(
+        'Картинка',
+        upload_to='posts/',
+        storage=ContentAddressedStorage(),
+        blank=True
+    )
+    created = models.DateTimeField('Дата создания', db_index=True)
+    # Переносится из Post и растёт при изменении группы или автора.
+    version = models.PositiveIntegerField('Версия', default=1,
+                                          editable=False)
+    excerpt = models.CharField('Анонс', max_length=EXCERPT_CHARS,
+                               default='', editable=False)
+    excerpt_html = models.TextField('HTML анонса', default='',
+                                    editable=False)
+    excerpt_truncated = models.BooleanField('Анонс обрезан', default=False,
+                                            editable=False)
+    image_width = models.PositiveIntegerField('Ширина картинки', null=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField('Высота картинки', null=True,
+                                               editable=False)
+    image_color = models.CharField('Цвет картинки', max_length=7,
+                                   default='', editable=False)
+    image_placeholder = models.TextField('Превью картинки', default='',
+                                         editable=False)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Архивный пост'
+        verbose_name_plural = 'Архивные посты'
+
+
+class ArchivedComment(CompressedTextMixin, models.Model):
+    id = models.PositiveIntegerField(primary_key=True)
+    post = models.ForeignKey(
+        'ArchivedPost',
+        on_delete=models.CASCADE,
+        related_name='comments',
+        verbose_name='Пост')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_comments',
+        verbose_name='Автор комментария'
+    )
+    text = models.TextField(verbose_name='Текст комментария')
+    created = models.DateTimeField('Дата создания', db_index=True)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
+
+    def __str__(self):
+        return self.text[:DISPLAYED_CHARS]
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -103,3 +250,75 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'Подписка {self.user} на {self.author}'
+
+
+class GroupStats(models.Model):
+    """Предрасчитанная статистика группы для каталога групп."""
+    group = models.OneToOneField(
+        'Group',
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Группа'
+    )
+    posts_count = models.PositiveIntegerField('Количество постов', default=0)
+    last_post = models.DateTimeField('Последняя активность',
+                                     blank=True,
+                                     null=True)
+    top_authors = models.CharField('Самые активные авторы',
+                                   max_length=500,
+                                   blank=True)
+
+    class Meta:
+        verbose_name = 'Статистика группы'
+        verbose_name_plural = 'Статистика групп'
+
+    def __str__(self):
+        return f'Статистика группы {self.group_id}'
+
+    @property
+    def top_authors_list(self):
+        return self.top_authors.split(',') if self.top_authors else []
+
+
+class Tombstone(CreatedModel):
+    """Отметка об удалении пользователя или группы.
+
+    Объект сразу скрывается с сайта, а зависимые строки удаляются
+    фоновой командой purge_tombstones небольшими пачками.
+    """
+    USER = 'user'
+    GROUP = 'group'
+    KIND_CHOICES = (
+        (USER, 'Пользователь'),
+        (GROUP, 'Группа'),
+    )
+    kind = models.CharField('Тип', max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField('ID объекта')
+    processed = models.PositiveIntegerField('Обработано строк', default=0)
+
+    class Meta:
+        verbose_name = 'Удаляемый объект'
+        verbose_name_plural = 'Удаляемые объекты'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'],
+                                    name='unique_tombstone')
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.object_id}'
+
+
+class ShardedId(models.Model):
+    """Общий счётчик id постов и комментариев для всех шардов."""
+
+    class Meta:
+        verbose_name = 'Id в шардах'
+        verbose_name_plural = 'Id в шардах'
+
+    @classmethod
+    def allocate(cls):
+        # AUTOINCREMENT не переиспользует id удалённых строк.
+        pk = cls.objects.create().pk
+        cls.objects.filter(pk=pk).delete()
+        return pk
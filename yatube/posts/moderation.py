@@ -0,0 +1,96 @@
+"""Массовая модерация постов и комментариев.
+
+Все операции выполняются пачками по CHUNK_SIZE строк, каждая пачка —
+один UPDATE или DELETE в своей транзакции. Сигналы по отдельным
+строкам не отправляются: после завершения отправляется один
+bulk_changed, по которому обновляются статистика и кэши. Функции
+работают в базе переданного queryset; при шардировании их вызывают
+для каждого шарда (см. sharding.every_shard).
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import Comment, Post
+from .signals import bulk_changed, release_image
+
+CHUNK_SIZE = 500
+
+
+def chunked_ids(queryset, chunk_size=CHUNK_SIZE):
+    """Отдаёт pk строк queryset пачками по возрастанию."""
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def _affected(queryset):
+    rows = queryset.order_by().values_list('group_id', 'author_id').distinct()
+    group_ids = {group_id for group_id, _ in rows if group_id is not None}
+    author_ids = {author_id for _, author_id in rows}
+    return group_ids, author_ids
+
+
+def regroup_posts(queryset, group, chunk_size=CHUNK_SIZE, progress=None):
+    """Переносит посты в группу group (или убирает из групп, если None)."""
+    group_ids, author_ids = _affected(queryset)
+    post_ids = []
+    for ids in chunked_ids(queryset, chunk_size):
+        with transaction.atomic(using=queryset.db):
+            Post.objects.using(queryset.db).filter(pk__in=ids).update(
+                group=group, version=F('version') + 1)
+        post_ids.extend(ids)
+        if progress:
+            progress(len(post_ids))
+    if group is not None:
+        group_ids.add(group.pk)
+    bulk_changed.send(sender=Post, post_ids=post_ids, group_ids=group_ids,
+                      author_ids=author_ids)
+    return len(post_ids)
+
+
+def delete_posts(queryset, chunk_size=CHUNK_SIZE, progress=None):
+    """Удаляет посты вместе с комментариями."""
+    group_ids, author_ids = _affected(queryset)
+    images = set(
+        queryset.exclude(image='').order_by()
+        .values_list('image', flat=True).distinct()
+    )
+    post_ids = []
+    for ids in chunked_ids(queryset, chunk_size):
+        with transaction.atomic(using=queryset.db):
+            comments = Comment.objects.using(queryset.db).filter(
+                post_id__in=ids)
+            comments._raw_delete(comments.db)
+            posts = Post.objects.using(queryset.db).filter(pk__in=ids)
+            posts._raw_delete(posts.db)
+        post_ids.extend(ids)
+        if progress:
+            progress(len(post_ids))
+    for image in images:
+        release_image(image)
+    bulk_changed.send(sender=Post, post_ids=post_ids, group_ids=group_ids,
+                      author_ids=author_ids)
+    return len(post_ids)
+
+
+def purge_comments(queryset, chunk_size=CHUNK_SIZE, progress=None):
+    """Удаляет комментарии из queryset."""
+    post_ids = set(
+        queryset.order_by().values_list('post_id', flat=True).distinct()
+    )
+    deleted = 0
+    for ids in chunked_ids(queryset, chunk_size):
+        with transaction.atomic(using=queryset.db):
+            comments = Comment.objects.using(queryset.db).filter(pk__in=ids)
+            comments._raw_delete(comments.db)
+        deleted += len(ids)
+        if progress:
+            progress(deleted)
+    bulk_changed.send(sender=Comment, post_ids=post_ids, group_ids=set(),
+                      author_ids=set())
+    return deleted
@@ -0,0 +1,210 @@
+"""Шардирование постов и комментариев по автору.
+
+Пост и комментарии к нему лежат в базе шарда автора поста, остальные
+модели - в default. Шарды перечислены в settings.POST_SHARDS, пустой
+список отключает шардирование, и всё работает как с одной базой.
+
+Ленты из нескольких шардов собирает FanOut: каждый шард отдаёт свой
+поток, упорядоченный по (created, id), а потоки сливаются кучей.
+"""
+import heapq
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.models import prefetch_related_objects
+
+SHARDED_MODELS = ('post', 'comment')
+
+ORDERING = ('-created', '-pk')
+
+
+def enabled():
+    return bool(settings.POST_SHARDS)
+
+
+def aliases():
+    """Базы, в которых лежат посты и комментарии."""
+    if not enabled():
+        return [DEFAULT_DB_ALIAS]
+    return list(dict.fromkeys(settings.POST_SHARDS))
+
+
+def every_shard(queryset):
+    """Копии queryset для каждой базы с постами."""
+    return [queryset.using(alias) for alias in aliases()]
+
+
+def shard_for(author_id):
+    """Возвращает alias базы, в которой лежат посты автора."""
+    if author_id in settings.POST_SHARD_MAP:
+        return settings.POST_SHARD_MAP[author_id]
+    return settings.POST_SHARDS[author_id % len(settings.POST_SHARDS)]
+
+
+def is_sharded(model):
+    return (model._meta.app_label == 'posts'
+            and model._meta.model_name in SHARDED_MODELS)
+
+
+def author_of(instance):
+    if instance is None:
+        return None
+    if instance._meta.model_name == 'post':
+        return instance.author_id
+    if instance._meta.model_name == 'comment' and instance.post_id:
+        return instance.post.author_id
+    return None
+
+
+class AuthorShardRouter:
+    """Направляет запросы к постам и комментариям в шард автора."""
+
+    def db_for_read(self, model, **hints):
+        if not enabled():
+            return None
+        if not is_sharded(model):
+            return 'default'
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if is_sharded(type(instance)):
+            return instance._state.db
+        if instance._meta.label == settings.AUTH_USER_MODEL:
+            return shard_for(instance.pk)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not enabled():
+            return None
+        if not is_sharded(model):
+            return 'default'
+        author_id = author_of(hints.get('instance'))
+        if author_id is None:
+            return None
+        return shard_for(author_id)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if enabled():
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not enabled() or db == 'default':
+            return None
+        return app_label == 'posts' and model_name in SHARDED_MODELS
+
+
+class ShardedQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # QuerySet.create передаёт в save() базу менеджера, а шард
+        # можно выбрать только по самому объекту.
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+
+def detach(queryset):
+    """Убирает из запроса join-ы к моделям из default.
+
+    Возвращает queryset и список связей для prefetch_related_objects.
+    """
+    related = queryset.query.select_related
+    if not isinstance(related, dict):
+        return queryset, ()
+    return queryset.select_related(None), tuple(related)
+
+
+class FanOut:
+    """Упорядоченная выборка постов из нескольких шардов для Paginator.
+
+    Для среза [start:stop] каждый шард отдаёт первые stop строк,
+    шарды опрашиваются параллельно, а результат сливается кучей.
+    """
+
+    def __init__(self, querysets, prefetch=()):
+        self.querysets = [queryset.order_by(*ORDERING)
+                          for queryset in querysets]
+        self.prefetch = prefetch
+        self._count = None
+
+    def map(self, func):
+        workers = min(len(self.querysets), settings.POST_SHARD_WORKERS)
+        if workers <= 1:
+            return [func(queryset) for queryset in self.querysets]
+
+        def run(queryset):
+            try:
+                return func(queryset)
+            finally:
+                connections[queryset.db].close()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run, self.querysets))
+
+    def count(self):
+        if self._count is None:
+            self._count = sum(self.map(lambda queryset: queryset.count()))
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            stop = self.count()
+        streams = self.map(lambda queryset: list(queryset[:stop]))
+        rows = list(islice(
+            heapq.merge(*streams, key=lambda post: (post.created, post.pk),
+                        reverse=True),
+            start, stop
+        ))
+        if self.prefetch:
+            prefetch_related_objects(rows, *self.prefetch)
+        return rows
+
+
+def feed(queryset):
+    """Лента по всем шардам."""
+    if not enabled():
+        return queryset
+    queryset, prefetch = detach(queryset)
+    return FanOut(every_shard(queryset), prefetch)
+
+
+def authors_feed(queryset, author_ids):
+    """Лента постов авторов author_ids: опрашиваются только их шарды."""
+    if not enabled():
+        return queryset.filter(author_id__in=author_ids)
+    queryset, prefetch = detach(queryset)
+    by_shard = defaultdict(list)
+    for author_id in author_ids:
+        by_shard[shard_for(author_id)].append(author_id)
+    return FanOut(
+        [queryset.using(alias).filter(author_id__in=ids)
+         for alias, ids in by_shard.items()],
+        prefetch
+    )
+
+
+def for_author(queryset, author_id):
+    """Выборка постов одного автора из его шарда."""
+    if not enabled():
+        return queryset
+    queryset, prefetch = detach(queryset)
+    return queryset.using(shard_for(author_id)).prefetch_related(*prefetch)
+
+
+def find_post(queryset, post_id):
+    """Ищет пост по id во всех шардах, возвращает None, если его нет."""
+    if not enabled():
+        return queryset.filter(pk=post_id).first()
+    queryset, prefetch = detach(queryset)
+    posts = FanOut(every_shard(queryset.filter(pk=post_id)), prefetch)[:1]
+    return posts[0] if posts else None
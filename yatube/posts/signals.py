@@ -0,0 +1,207 @@
+from core.pagecache import invalidate_pages
+from core.storage import is_stale
+from core.surrogate import purge
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import Signal, receiver
+
+from . import sharding
+from .cache import invalidate_group
+from .models import ArchivedPost, Comment, Group, GroupStats, Post, ShardedId
+from .stats import (author_renamed, post_added, post_removed,
+                    refresh_group_stats)
+
+User = get_user_model()
+
+comments_flushed = Signal(providing_args=['post_ids'])
+
+# Отправляется один раз после массовой операции над постами или
+# комментариями (см. posts.moderation) вместо сигналов по строкам.
+bulk_changed = Signal(providing_args=['post_ids', 'group_ids', 'author_ids'])
+
+
+def release_image(name):
+    """Удаляет файл картинки, если на него больше не ссылаются посты.
+
+    Свежие файлы остаются до collect_media_garbage: такой же файл могли
+    только что загрузить для нового, ещё не сохранённого поста.
+    """
+    if not name or ArchivedPost.objects.filter(image=name).exists():
+        return
+    if any(posts.filter(image=name).exists()
+           for posts in sharding.every_shard(Post.objects.all())):
+        return
+    storage = Post._meta.get_field('image').storage
+    try:
+        if is_stale(storage, name, settings.POST_IMAGE_GRACE):
+            storage.delete(name)
+    except SuspiciousFileOperation:
+        pass
+
+
+@receiver(connection_created)
+def relax_shard_constraints(sender, connection, **kwargs):
+    # Авторы и группы живут в default, поэтому внешние ключи постов
+    # в шардах SQLite проверить не может.
+    if (connection.vendor == 'sqlite' and connection.alias != 'default'
+            and connection.alias in settings.POST_SHARDS):
+        connection.connection.execute('PRAGMA foreign_keys = OFF')
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def allocate_sharded_id(sender, instance, **kwargs):
+    if instance.pk is None and sharding.enabled():
+        instance.pk = ShardedId.allocate()
+
+
+def bump_versions(posts):
+    """Сбрасывает кэш отрисованных постов, см. posts.snippets."""
+    posts.update(version=F('version') + 1)
+
+
+def group_keys(*group_ids):
+    """Метки surrogate-ключей групп; без прокси запрос не делается."""
+    group_ids = [group_id for group_id in group_ids if group_id]
+    if not settings.SURROGATE_PURGE_URL or not group_ids:
+        return []
+    return [f'group:{slug}' for slug in Group.objects.filter(
+        pk__in=group_ids).values_list('slug', flat=True)]
+
+
+@receiver(pre_save, sender=Post)
+def bump_post_version(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance.version += 1
+
+
+@receiver(post_init, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+    image = instance.__dict__.get('image')
+    instance._loaded_image = getattr(image, 'name', image)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created or instance._loaded_group_id != instance.group_id:
+        post_added(instance.group_id, instance.author_id, instance.created)
+    if not created and instance._loaded_group_id != instance.group_id:
+        post_removed(instance._loaded_group_id, instance.author_id,
+                     instance.created)
+    if not created and instance._loaded_image != instance.image.name:
+        old_image = instance._loaded_image
+        transaction.on_commit(lambda: release_image(old_image))
+    if created:
+        purge('index', f'author:{instance.author_id}',
+              *group_keys(instance.group_id))
+    elif instance._loaded_group_id != instance.group_id:
+        purge(f'post:{instance.pk}', *group_keys(instance._loaded_group_id,
+                                                 instance.group_id))
+    else:
+        purge(f'post:{instance.pk}')
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    post_removed(instance._loaded_group_id, instance.author_id,
+                 instance.created)
+    old_image = instance._loaded_image
+    transaction.on_commit(lambda: release_image(old_image))
+    purge('index', f'post:{instance.pk}', f'author:{instance.author_id}',
+          *group_keys(instance._loaded_group_id))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    purge(f'post:{instance.post_id}')
+
+
+@receiver(post_init, sender=Group)
+def remember_group_state(sender, instance, **kwargs):
+    instance._loaded_slug = instance.__dict__.get('slug')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if created:
+        GroupStats.objects.get_or_create(group=instance)
+    invalidate_group(instance._loaded_slug, instance.slug)
+    purge(*{f'group:{instance._loaded_slug}', f'group:{instance.slug}'})
+    if not created and instance._loaded_slug != instance.slug:
+        bump_versions(Post.objects.filter(group=instance))
+        bump_versions(ArchivedPost.objects.filter(group=instance))
+    instance._loaded_slug = instance.slug
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    bump_versions(Post.objects.filter(group=instance))
+    bump_versions(ArchivedPost.objects.filter(group=instance))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    invalidate_group(instance._loaded_slug, instance.slug)
+    purge(f'group:{instance.slug}')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(bulk_changed)
+@receiver(comments_flushed)
+def content_changed(sender, **kwargs):
+    invalidate_pages()
+
+
+@receiver(bulk_changed)
+def purge_after_bulk_change(sender, post_ids, group_ids, author_ids,
+                            **kwargs):
+    purge('index', *(f'post:{post_id}' for post_id in post_ids),
+          *(f'author:{author_id}' for author_id in author_ids),
+          *group_keys(*group_ids))
+
+
+@receiver(comments_flushed)
+def purge_after_comments_flushed(sender, post_ids, **kwargs):
+    purge(*(f'post:{post_id}' for post_id in post_ids))
+
+
+@receiver(bulk_changed)
+def refresh_stats_after_bulk_change(sender, group_ids, **kwargs):
+    for group_id in group_ids:
+        refresh_group_stats(group_id)
+
+
+@receiver(post_init, sender=User)
+def remember_author_names(sender, instance, **kwargs):
+    instance._loaded_names = (instance.__dict__.get('username'),
+                              instance.__dict__.get('first_name'),
+                              instance.__dict__.get('last_name'))
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, **kwargs):
+    names = (instance.username, instance.first_name, instance.last_name)
+    if not created and instance._loaded_names != names:
+        bump_versions(sharding.for_author(
+            Post.objects.filter(author=instance), instance.pk))
+        bump_versions(ArchivedPost.objects.filter(author=instance))
+        if instance._loaded_names[0] != instance.username:
+            author_renamed(instance._loaded_names[0])
+        invalidate_pages()
+        purge(f'author:{instance.pk}')
+    instance._loaded_names = names
@@ -0,0 +1,58 @@
+"""Кэш отрисованных постов для лент.
+
+Ключ включает id и версию поста, язык и то, выводится ли ссылка на
+группу. Версия растёт при изменении поста, его группы или автора,
+поэтому старые фрагменты просто перестают читаться.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from core import metrics
+
+from .models import ArchivedPost
+from .thumbnails import image_name, prefetch_thumbnails
+
+SNIPPET_CACHE_KEY = 'posts:snippet:v5:{}:{}:{}:{}:{}'
+
+SNIPPET_TEMPLATE = 'posts/includes/post_list.html'
+
+
+def snippet_key(post, show_group, language):
+    kind = 'archived' if isinstance(post, ArchivedPost) else 'post'
+    return SNIPPET_CACHE_KEY.format(
+        kind, post.pk, post.version, int(show_group), language
+    )
+
+
+def render_snippets(posts, show_group=True):
+    """Возвращает пары (пост, HTML) одним get_many и одним set_many.
+
+    Миниатюры для недостающих фрагментов читаются одним пакетом;
+    фрагменты с ещё не готовой миниатюрой не кэшируются.
+    """
+    posts = list(posts)
+    language = get_language()
+    keys = [snippet_key(post, show_group, language) for post in posts]
+    snippets = cache.get_many(keys)
+    missing = [(key, post) for key, post in zip(keys, posts)
+               if key not in snippets]
+    images = prefetch_thumbnails(image_name(post) for _, post in missing)
+    rendered = {}
+    for key, post in missing:
+        image_url, ready = images.get(image_name(post), ('', True))
+        snippets[key] = render_to_string(SNIPPET_TEMPLATE, {
+            'post': post,
+            'show_group': show_group,
+            'image_url': image_url,
+            'image_ready': ready
+        })
+        if ready:
+            rendered[key] = snippets[key]
+    if rendered:
+        cache.set_many(rendered, settings.SNIPPET_CACHE_TIMEOUT)
+    metrics.increment('snippets.hits', len(posts) - len(missing))
+    metrics.increment('snippets.misses', len(missing))
+    return [(post, mark_safe(snippets[key])) for key, post in zip(keys, posts)]
@@ -0,0 +1,138 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db.models import (Case, Count, DateTimeField, F, Max, Q, Value,
+                              When)
+
+from . import sharding
+from .models import TOP_AUTHORS_COUNT, ArchivedPost, GroupStats, Post
+
+User = get_user_model()
+
+
+def group_posts(group_id):
+    """Посты группы во всех шардах."""
+    return sharding.every_shard(Post.objects.filter(group_id=group_id))
+
+
+def author_counts(group_id, author_ids=None):
+    """Возвращает {id автора: число его постов в группе}."""
+    counts = Counter()
+    for posts in group_posts(group_id):
+        if author_ids is not None:
+            posts = posts.filter(author_id__in=author_ids)
+        counts.update(dict(
+            posts.order_by().values('author_id')
+            .annotate(posts_count=Count('id'))
+            .values_list('author_id', 'posts_count')
+        ))
+    return counts
+
+
+def last_post_of(group_id):
+    dates = [posts.aggregate(last_post=Max('created'))['last_post']
+             for posts in group_posts(group_id)]
+    return max(filter(None, dates), default=None)
+
+
+def top_authors_of(group_id):
+    counts = author_counts(group_id)
+    if not counts:
+        return ''
+    # Имена нужны только претендентам: при равенстве решает имя.
+    threshold = sorted(counts.values(), reverse=True)[
+        :TOP_AUTHORS_COUNT][-1]
+    usernames = User.objects.filter(
+        pk__in=[author_id for author_id, posts_count in counts.items()
+                if posts_count >= threshold]
+    ).values_list('pk', 'username')
+    ranked = sorted((-counts[author_id], username)
+                    for author_id, username in usernames)
+    return ','.join(username for _, username in ranked[:TOP_AUTHORS_COUNT])
+
+
+def refresh_group_stats(group_id):
+    """Пересчитывает статистику одной группы целиком."""
+    if group_id is None:
+        return
+    posts_count = sum(posts.count() for posts in group_posts(group_id))
+    GroupStats.objects.update_or_create(
+        group_id=group_id,
+        defaults={
+            'posts_count': posts_count + ArchivedPost.objects
+            .filter(group_id=group_id).count(),
+            'last_post': last_post_of(group_id),
+            'top_authors': top_authors_of(group_id),
+        }
+    )
+
+
+def author_renamed(old_username):
+    """Пересчитывает top_authors групп, где автор был под старым именем."""
+    for stats in GroupStats.objects.filter(top_authors__contains=old_username):
+        if old_username in stats.top_authors_list:
+            stats.top_authors = top_authors_of(stats.group_id)
+            stats.save(update_fields=['top_authors'])
+
+
+def needs_new_top(stats, author_id, username, added):
+    """Может ли пост автора username изменить список top_authors."""
+    top = stats.top_authors_list
+    if username in top:
+        # Лидер с новым постом остаётся лидером.
+        return not added or top[0] != username
+    if not added:
+        return False
+    if len(top) < TOP_AUTHORS_COUNT:
+        return True
+    last_id = (User.objects.filter(username=top[-1])
+               .values_list('pk', flat=True).first())
+    counts = author_counts(stats.group_id, [author_id, last_id])
+    return ((counts[author_id], top[-1])
+            >= (counts[last_id], username))
+
+
+def post_added(group_id, author_id, created):
+    """Учитывает в статистике группы новый пост."""
+    if group_id is None:
+        return
+    updated = GroupStats.objects.filter(group_id=group_id).update(
+        posts_count=F('posts_count') + 1,
+        last_post=Case(
+            When(Q(last_post=None) | Q(last_post__lt=created),
+                 then=Value(created, output_field=DateTimeField())),
+            default=F('last_post')
+        )
+    )
+    if not updated:
+        refresh_group_stats(group_id)
+        return
+    update_top_authors(group_id, author_id, added=True)
+
+
+def post_removed(group_id, author_id, created):
+    """Убирает из статистики группы удалённый или перенесённый пост."""
+    if group_id is None:
+        return
+    updated = GroupStats.objects.filter(
+        group_id=group_id, posts_count__gt=0
+    ).update(posts_count=F('posts_count') - 1)
+    if not updated:
+        refresh_group_stats(group_id)
+        return
+    stats = GroupStats.objects.get(group_id=group_id)
+    if stats.last_post == created:
+        stats.last_post = last_post_of(group_id)
+        stats.save(update_fields=['last_post'])
+    update_top_authors(group_id, author_id, added=False, stats=stats)
+
+
+def update_top_authors(group_id, author_id, added, stats=None):
+    if stats is None:
+        stats = GroupStats.objects.get(group_id=group_id)
+    username = (User.objects.filter(pk=author_id)
+                .values_list('username', flat=True).first())
+    if username is not None and needs_new_top(stats, author_id, username,
+                                              added):
+        stats.top_authors = top_authors_of(group_id)
+        stats.save(update_fields=['top_authors'])
@@ -0,0 +1,11 @@
+from django import template
+
+from posts.snippets import render_snippets
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_snippets(posts, show_group=True):
+    """Пары (пост, HTML) для ленты, см. posts.snippets."""
+    return render_snippets(posts, show_group)
@@ -0,0 +1,56 @@
+import pickle
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..feed import CachedFeed, FeedRow, dumps, loads
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class FeedSerializationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author',
+                                            first_name='Имя',
+                                            last_name='Фамилия')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for i in range(10):
+            Post.objects.create(text=f'Пост {i}', author=cls.user,
+                                group=cls.group if i % 2 else None,
+                                image=f'posts/{i}.gif')
+
+    def setUp(self):
+        cache.clear()
+        self.posts = list(Post.objects.select_related('author', 'group'))
+
+    def test_rows_render_like_posts(self):
+        """Строки ленты отдают те же данные, что и посты."""
+        for post, row in zip(self.posts, loads(dumps(self.posts))):
+            with self.subTest(post=post.pk):
+                self.assertIsInstance(row, FeedRow)
+                self.assertEqual(row.pk, post.pk)
+                self.assertEqual(row.excerpt_html, post.excerpt_html)
+                self.assertEqual(row.image, post.image.name)
+                self.assertEqual(row.created, post.created)
+                self.assertEqual(row.author.get_full_name(), 'Имя Фамилия')
+                self.assertEqual(row.group and row.group.slug,
+                                 post.group and post.group.slug)
+
+    def test_rows_smaller_than_pickled_posts(self):
+        """Упакованная страница заметно меньше pickle экземпляров Post."""
+        self.assertLess(len(dumps(self.posts)) * 2,
+                        len(pickle.dumps(self.posts)))
+
+    def test_cached_feed_pages(self):
+        """Страница ленты второй раз читается из кэша без запросов."""
+        feed = CachedFeed('test', Post.objects.select_related('author',
+                                                              'group'))
+        first = feed[0:5]
+        with self.assertNumQueries(0):
+            second = CachedFeed('test', Post.objects.all())[0:5]
+        self.assertEqual([row.pk for row in first],
+                         [row.pk for row in second])
@@ -1,14 +1,23 @@
+import os
 import shutil
+import sqlite3
 import tempfile
+from contextlib import closing
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from .. import comment_queue
 from ..models import Comment, Group, Post
+from ..signals import release_image
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -104,6 +113,145 @@ class PostFormTest(TestCase):
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
 
+    def test_same_images_are_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом"""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00'
+            b'\x01\x00\x00\xff\x00\x2c\x00\x00'
+            b'\x00\x00\x01\x00\x01\x00\x00\x02'
+            b'\x00\x3b'
+        )
+        for name in ('first.gif', 'second.gif'):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={
+                    'text': 'Пост с картинкой',
+                    'image': SimpleUploadedFile(name, small_gif,
+                                                content_type='image/gif')
+                }
+            )
+        first, second = Post.objects.filter(text='Пост с картинкой')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.endswith('.gif'))
+        first.delete()
+        self.assertTrue(os.path.exists(second.image.path))
+        second.image = ''
+        second.save()
+        call_command('collect_media_garbage', grace=-1,
+                     stdout=StringIO())
+        self.assertFalse(os.path.exists(first.image.path))
+
+    def test_released_image_kept_during_grace(self):
+        """Свежий файл без ссылок не удаляется сразу"""
+        content = BytesIO()
+        Image.new('RGB', (4, 4), 'green').save(content, format='PNG')
+        post = Post.objects.create(
+            author=PostFormTest.user, text='Пост',
+            image=SimpleUploadedFile('green.png', content.getvalue(),
+                                     content_type='image/png'))
+        path = post.image.path
+        post.image = ''
+        post.save()
+        release_image(os.path.relpath(path, TEMP_MEDIA_ROOT))
+        self.assertTrue(os.path.exists(path))
+        with self.settings(POST_IMAGE_GRACE=-1):
+            release_image(os.path.relpath(path, TEMP_MEDIA_ROOT))
+        self.assertFalse(os.path.exists(path))
+
+    def test_image_limits_checked_while_uploading(self):
+        """Слишком большие картинки отклоняются до декодирования"""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        limits = (
+            {'POST_IMAGE_MAX_BYTES': 10},
+            {'POST_IMAGE_MAX_DIMENSION': 1},
+        )
+        for limit in limits:
+            with self.subTest(limit=limit), self.settings(**limit):
+                response = self.authorized_client.post(
+                    reverse('posts:post_create'),
+                    data={
+                        'text': 'Пост с большой картинкой',
+                        'image': SimpleUploadedFile(
+                            'big.gif', small_gif, content_type='image/gif')
+                    }
+                )
+                self.assertTrue(response.context['form'].errors['image'])
+        self.assertEqual(Post.objects.count(), self.post_count)
+
+    def test_decompression_bomb_rejected(self):
+        """Картинка больше лимита Pillow отклоняется ошибкой формы"""
+        content = BytesIO()
+        Image.new('1', (20000, 20000)).save(content, format='PNG')
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с огромной картинкой',
+                'image': SimpleUploadedFile('bomb.png', content.getvalue(),
+                                            content_type='image/png')
+            }
+        )
+        self.assertIn('Картинка слишком большая',
+                      response.context['form'].errors['image'][0])
+        self.assertEqual(Post.objects.count(), self.post_count)
+
+    @override_settings(POST_IMAGE_RESIZE_TO=10)
+    def test_oversized_image_is_downsized(self):
+        """Большая картинка уменьшается перед сохранением"""
+        content = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(content, format='PNG')
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с уменьшенной картинкой',
+                'image': SimpleUploadedFile('big.png', content.getvalue(),
+                                            content_type='image/png')
+            }
+        )
+        post = Post.objects.get(text='Пост с уменьшенной картинкой')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (10, 5))
+
+    def test_image_meta_recorded_on_upload(self):
+        """При загрузке сохраняются размеры, цвет и превью картинки"""
+        content = BytesIO()
+        Image.new('RGB', (40, 20), (0, 128, 255)).save(content, format='PNG')
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с синей картинкой',
+                'image': SimpleUploadedFile('blue.png', content.getvalue(),
+                                            content_type='image/png')
+            }
+        )
+        post = Post.objects.get(text='Пост с синей картинкой')
+        self.assertEqual((post.image_width, post.image_height), (40, 20))
+        self.assertEqual(post.image_color, '#0080ff')
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,'))
+        # Миниатюры ещё нет: исходная картинка выводится в своих размерах.
+        for url in (reverse('posts:post_detail',
+                            kwargs={'post_id': post.pk}),
+                    reverse('posts:index')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'width="40" height="20"')
+                self.assertContains(response, 'loading="lazy"')
+                self.assertContains(response, post.image_placeholder)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': post.text, 'image-clear': 'on'}
+        )
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
+
     def test_post_edit_form(self):
         """Валидная форма редактирует запись"""
         form_data = {
@@ -160,3 +308,71 @@ class PostFormTest(TestCase):
                 author=PostFormTest.user,
                 post=self.post
             ).exists())
+
+    def test_add_comment_write_behind(self):
+        """Отложенный комментарий виден автору до переноса в базу"""
+        queue_path = os.path.join(TEMP_MEDIA_ROOT, 'queue.sqlite3')
+        with self.settings(COMMENTS_WRITE_BEHIND=True,
+                           COMMENTS_QUEUE_PATH=queue_path):
+            self.authorized_client.post(
+                reverse('posts:add_comment', args={self.post.id}),
+                data={'text': 'Отложенный комментарий'}
+            )
+            self.assertEqual(self.post.comments.count(), 0)
+            response = self.authorized_client.get(
+                reverse('posts:post_detail', args={self.post.id}))
+            self.assertContains(response, 'Отложенный комментарий')
+            self.assertEqual(comment_queue.flush(), 1)
+            self.assertTrue(
+                Comment.objects.filter(
+                    text='Отложенный комментарий',
+                    author=PostFormTest.user,
+                    post=self.post
+                ).exists())
+            response = self.authorized_client.get(
+                reverse('posts:post_detail', args={self.post.id}))
+            self.assertEqual(len(response.context['comments']), 1)
+
+    def test_flush_keeps_created_and_skips_deleted_authors(self):
+        """Перенос сохраняет дату комментария и пропускает удалённых"""
+        queue_path = os.path.join(TEMP_MEDIA_ROOT, 'flush.sqlite3')
+        gone = User.objects.create_user(username='Gone')
+        with self.settings(COMMENTS_QUEUE_PATH=queue_path):
+            comment_queue.enqueue(self.post.pk, PostFormTest.user.pk,
+                                  'Ранний комментарий')
+            comment_queue.enqueue(self.post.pk, gone.pk, 'Сирота')
+            gone.delete()
+            with closing(comment_queue._connect()) as connection, connection:
+                connection.execute(
+                    "UPDATE comment_queue SET created = ?",
+                    ('2020-01-02T03:04:05+00:00',))
+            self.assertEqual(comment_queue.flush(), 1)
+            self.assertEqual(comment_queue.flush(), 0)
+        comment = Comment.objects.get(post=self.post)
+        self.assertEqual(comment.text, 'Ранний комментарий')
+        self.assertEqual(comment.created.year, 2020)
+
+    def test_queue_connections_closed(self):
+        """Очередь закрывает соединения и создаёт схему один раз"""
+        queue_path = os.path.join(TEMP_MEDIA_ROOT, 'closed.sqlite3')
+        opened = []
+        real_connect = sqlite3.connect
+
+        def connect(*args, **kwargs):
+            opened.append(real_connect(*args, **kwargs))
+            return opened[-1]
+
+        spy = mock.patch.object(comment_queue, '_create_schema',
+                                wraps=comment_queue._create_schema)
+        with self.settings(COMMENTS_QUEUE_PATH=queue_path), \
+                mock.patch('sqlite3.connect', connect), spy as schema:
+            queue_id = comment_queue.enqueue(self.post.pk,
+                                             PostFormTest.user.pk, 'Текст')
+            self.assertEqual(comment_queue.queued_ids([queue_id]),
+                             {queue_id})
+            self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(schema.call_count, 1)
+        self.assertEqual(len(opened), 3)
+        for connection in opened:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                connection.execute('SELECT 1')
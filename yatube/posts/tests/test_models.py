@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from ..models import Group, Post
+from core.compression import is_compressed
+
+from ..models import Comment, Group, Post
 
 User = get_user_model()
 
@@ -40,3 +42,19 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     Group._meta.get_field(field).verbose_name, expected_value)
+
+    def test_long_text_stored_compressed(self):
+        """Длинный текст лежит в базе сжатым, а модель видит исходный."""
+        text = 'Длинный пост о погоде в Москве и области.\n' * 100
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(text=text, author=author)
+        self.assertEqual(post.text, text)
+        stored = Post.objects.values_list('text', flat=True).get(pk=post.pk)
+        self.assertTrue(is_compressed(stored))
+        self.assertLess(len(stored), len(text))
+        self.assertEqual(Post.objects.get(pk=post.pk).text, text)
+        deferred = Post.objects.defer('text').get(pk=post.pk)
+        self.assertEqual(deferred.text, text)
+        comment = Comment.objects.create(post=post, author=author, text=text)
+        comment.refresh_from_db()
+        self.assertEqual(comment.text, text)
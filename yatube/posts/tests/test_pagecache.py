@@ -0,0 +1,65 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core import metrics
+
+from ..models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Текст поста', author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client(enforce_csrf_checks=True)
+        self.reader_client.force_login(self.reader)
+
+    def test_cached_page_filled_per_user(self):
+        """Страница из кэша получает шапку и кнопки текущего пользователя."""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        author_page = self.author_client.get(url).content.decode()
+        reader_page = self.reader_client.get(url).content.decode()
+        self.assertEqual(metrics.snapshot()['counters']['pages.hits'], 1)
+        self.assertIn('Пользователь: author', author_page)
+        self.assertIn('Все ваши посты', author_page)
+        self.assertIn('Пользователь: reader', reader_page)
+        self.assertIn('Отписаться', reader_page)
+        self.assertNotIn('Все ваши посты', reader_page)
+
+    def test_cached_page_gets_own_csrf_token(self):
+        """CSRF-токен подставляется для каждого пользователя заново."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.author_client.get(url)
+        page = self.reader_client.get(url).content.decode()
+        self.assertNotIn('редактировать запись', page)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"',
+                          page).group(1)
+        response = self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий', 'csrfmiddlewaretoken': token}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Comment.objects.filter(text='Комментарий').exists())
+
+    def test_changes_invalidate_pages(self):
+        """Новый пост сразу виден на закэшированной странице."""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.reader_client.get(url)
+        Post.objects.create(text='Свежий пост', author=self.author)
+        self.assertIn('Свежий пост',
+                      self.reader_client.get(url).content.decode())
@@ -0,0 +1,163 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..archive import archive_posts
+from ..models import ArchivedComment, ArchivedPost, Comment, Group, Post
+from ..sharding import AuthorShardRouter, FanOut, shard_for
+
+User = get_user_model()
+
+
+@override_settings(POST_SHARD_WORKERS=1)
+class FanOutTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.first = User.objects.create_user(username='first')
+        cls.second = User.objects.create_user(username='second')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        start = timezone.now()
+        for i in range(25):
+            post = Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.first if i % 3 else cls.second,
+                group=cls.group
+            )
+            Post.objects.filter(pk=post.pk).update(
+                created=start - timedelta(minutes=i * 7 % 25))
+
+    def test_merge_matches_single_query(self):
+        """Слияние потоков по авторам совпадает с общей выборкой."""
+        expected = list(
+            Post.objects.order_by('-created', '-pk').values_list('pk',
+                                                                 flat=True)
+        )
+        fan_out = FanOut([Post.objects.filter(author=self.first),
+                          Post.objects.filter(author=self.second)],
+                         prefetch=('group',))
+        self.assertEqual(fan_out.count(), 25)
+        for start, stop in ((0, 10), (10, 20), (20, 25), (5, 6)):
+            with self.subTest(start=start, stop=stop):
+                self.assertEqual([post.pk for post in fan_out[start:stop]],
+                                 expected[start:stop])
+        with self.assertNumQueries(3):
+            post = fan_out[0:1][0]
+        with self.assertNumQueries(0):
+            self.assertEqual(post.group, self.group)
+
+
+@override_settings(POST_SHARDS=['default', 'shard_1'], POST_SHARD_MAP={})
+class AuthorShardRouterTest(TestCase):
+    def test_routes_by_author(self):
+        """Пост и комментарии к нему пишутся в шард автора поста."""
+        router = AuthorShardRouter()
+        author = User(pk=3)
+        post = Post(pk=10, author=author)
+        comment = Comment(post=post, author=User(pk=4))
+        self.assertEqual(shard_for(3), 'shard_1')
+        self.assertEqual(router.db_for_write(Post, instance=post), 'shard_1')
+        self.assertEqual(router.db_for_write(Comment, instance=comment),
+                         'shard_1')
+        self.assertEqual(router.db_for_read(Post, instance=author),
+                         'shard_1')
+        self.assertEqual(router.db_for_read(Group), 'default')
+        self.assertFalse(router.allow_migrate('shard_1', 'posts', 'group'))
+        self.assertTrue(router.allow_migrate('shard_1', 'posts', 'post'))
+
+    @override_settings(POST_SHARD_MAP={3: 'default'})
+    def test_shard_map_overrides_modulo(self):
+        """POST_SHARD_MAP закрепляет автора за шардом."""
+        self.assertEqual(shard_for(3), 'default')
+
+
+@override_settings(POST_SHARDS=['default', 'shard_1'], POST_SHARD_MAP={},
+                   POST_SHARD_WORKERS=1)
+class TwoShardsTest(TransactionTestCase):
+    """Посты и комментарии в двух настоящих базах."""
+    databases = {'default', 'shard_1'}
+
+    def setUp(self):
+        # Как в relax_shard_constraints: авторы и группы лежат в default.
+        shard = connections['shard_1']
+        shard.disable_constraint_checking()
+        self.addCleanup(shard.enable_constraint_checking)
+        cache.clear()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        users = [User.objects.create_user(username=f'user{i}')
+                 for i in range(2)]
+        self.even, self.odd = sorted(users, key=lambda user: user.pk % 2)
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.posts = [
+            Post.objects.create(text=f'Пост {i}', group=self.group,
+                                author=self.odd if i % 2 else self.even)
+            for i in range(6)
+        ]
+
+    def test_writes_go_to_author_shard(self):
+        """Пост и комментарии к нему лежат в шарде автора поста."""
+        post = self.posts[1]
+        Comment.objects.create(post=post, author=self.even, text='Коммент')
+        self.assertEqual(Post.objects.using('shard_1').count(), 3)
+        self.assertEqual(Post.objects.using('default').count(), 3)
+        self.assertTrue(Post.objects.using('shard_1').filter(
+            pk=post.pk).exists())
+        self.assertEqual(Comment.objects.using('shard_1').count(), 1)
+        self.assertEqual(Comment.objects.using('default').count(), 0)
+        self.group.stats.refresh_from_db()
+        self.assertEqual(self.group.stats.posts_count, 6)
+
+    def test_feed_merges_shards(self):
+        """Лента собирает посты обоих шардов по дате."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [post.pk for post in reversed(self.posts)]
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.posts[1].pk,)))
+        self.assertEqual(response.status_code, 200)
+
+    def test_moderation_in_every_shard(self):
+        """moderate_posts находит посты по автору и тексту в каждом шарде."""
+        call_command('moderate_posts', '--delete', '--author',
+                     self.odd.username, stdout=StringIO())
+        self.assertEqual(Post.objects.using('shard_1').count(), 0)
+        self.assertEqual(Post.objects.using('default').count(), 3)
+        out = StringIO()
+        call_command('moderate_posts', '--delete', '--dry-run',
+                     '--text', 'Пост', stdout=out)
+        self.assertIn('Будет затронуто постов: 3', out.getvalue())
+
+    def test_archive_every_shard(self):
+        """Архивирование переносит посты из всех шардов."""
+        Comment.objects.create(post=self.posts[1], author=self.even,
+                               text='Коммент')
+        self.assertEqual(archive_posts(timezone.now()), 6)
+        self.assertEqual(ArchivedPost.objects.count(), 6)
+        self.assertEqual(ArchivedComment.objects.count(), 1)
+        for alias in ('default', 'shard_1'):
+            self.assertFalse(Post.objects.using(alias).exists())
+            self.assertFalse(Comment.objects.using(alias).exists())
+
+    def test_admin_reads_shards(self):
+        """Админка показывает выбранный шард и открывает пост из любого."""
+        self.client.force_login(self.admin)
+        url = reverse('admin:posts_post_changelist')
+        for alias, author in (('default', self.even),
+                              ('shard_1', self.odd)):
+            with self.subTest(alias=alias):
+                response = self.client.get(url, {'shard': alias})
+                posts = response.context['cl'].result_list
+                self.assertEqual({post.author for post in posts}, {author})
+        response = self.client.get(reverse('admin:posts_post_change',
+                                           args=(self.posts[1].pk,)))
+        self.assertEqual(response.status_code, 200)
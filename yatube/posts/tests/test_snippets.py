@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from core import metrics
+
+from ..models import ArchivedPost, Group, Post
+from ..snippets import render_snippets
+
+User = get_user_model()
+
+
+class PostSnippetsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author',
+                                            first_name='Имя',
+                                            last_name='Фамилия')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=cls.user,
+                                group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def render(self):
+        posts = Post.objects.select_related('author', 'group')
+        return ''.join(html for _, html in render_snippets(posts))
+
+    def test_snippets_rendered_once(self):
+        """Посты ленты отрисовываются один раз и читаются из кэша."""
+        first = self.render()
+        self.assertEqual(self.render(), first)
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters['snippets.misses'], 3)
+        self.assertEqual(counters['snippets.hits'], 3)
+
+    def test_post_edit_invalidates_snippet(self):
+        """Изменённый пост отрисовывается заново."""
+        self.render()
+        post = Post.objects.first()
+        post.text = 'Новый текст'
+        post.save()
+        self.assertIn('Новый текст', self.render())
+        self.assertEqual(metrics.snapshot()['counters']['snippets.hits'], 2)
+
+    def test_author_and_group_renames_invalidate_snippets(self):
+        """Переименование автора или группы обновляет фрагменты."""
+        self.render()
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Другое'
+        user.save()
+        self.assertIn('Другое Фамилия', self.render())
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        self.assertIn('/group/renamed/', self.render())
+
+    def test_partial_save_invalidates_snippet(self):
+        """Сохранение части полей тоже увеличивает версию поста."""
+        self.render()
+        post = Post.objects.first()
+        post.text = 'Новый текст'
+        post.save(update_fields=['text'])
+        self.assertIn('Новый текст', self.render())
+
+    def test_author_rename_invalidates_archived_snippets(self):
+        """Переименование автора обновляет и фрагменты архивных постов."""
+        post = Post.objects.first()
+        ArchivedPost.objects.create(id=post.pk + 100, text='Архив',
+                                    author=self.user, created=post.created)
+        archived = ArchivedPost.objects.select_related('author', 'group')
+        render_snippets(archived)
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Другое'
+        user.save()
+        html = ''.join(html for _, html in render_snippets(archived.all()))
+        self.assertIn('Другое Фамилия', html)
@@ -0,0 +1,124 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.surrogate import dispatcher
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class SurrogateHeadersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Текст поста', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_tagged(self):
+        """Анонимные страницы получают метки постов, авторов и групп."""
+        pages = {
+            reverse('posts:index'): 'index',
+            reverse('posts:group_list', kwargs={'slug': 'group'}):
+                'group:group',
+            reverse('posts:profile', kwargs={'username': 'author'}):
+                f'author:{self.author.pk}',
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}):
+                f'post:{self.post.pk}',
+        }
+        for url, key in pages.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                keys = response['Surrogate-Key'].split()
+                self.assertIn(key, keys)
+                self.assertIn(f'post:{self.post.pk}', keys)
+                self.assertIn('s-maxage=60', response['Cache-Control'])
+                self.assertIn('public', response['Cache-Control'])
+
+    def test_authorized_pages_private(self):
+        """Страницы вошедшего пользователя прокси не кэширует."""
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Surrogate-Key'))
+        self.assertIn('private', response['Cache-Control'])
+
+
+class PurgeRecorder(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        self.received.append(self.headers['Surrogate-Key'].split())
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class SurrogatePurgeTest(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = HTTPServer(('127.0.0.1', 0), PurgeRecorder)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+        PurgeRecorder.received.clear()
+        url = 'http://127.0.0.1:{}/purge'.format(self.server.server_port)
+        self.settings_override = override_settings(
+            SURROGATE_PURGE_URL=url, SURROGATE_PURGE_DELAY=0)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+
+    def test_purge_on_change(self):
+        """Изменения постов и комментариев сбрасывают свои метки."""
+        post = Post.objects.create(text='Текст', author=self.author,
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.author, text='Коммент')
+        post.group = None
+        post.save()
+        self.assertEqual(PurgeRecorder.received, [
+            [f'author:{self.author.pk}', 'group:group', 'index'],
+            [f'post:{post.pk}'],
+            ['group:group', f'post:{post.pk}'],
+        ])
+
+    def test_purge_batched_after_delay(self):
+        """Метки за время задержки уходят пачками без повторов."""
+        authors = [self.author] + [
+            User.objects.create_user(username=f'user{index}')
+            for index in range(2)
+        ]
+        with override_settings(SURROGATE_PURGE_DELAY=60,
+                               SURROGATE_PURGE_BATCH=2):
+            for author in authors * 2:
+                Post.objects.create(text='Текст', author=author)
+            self.assertEqual(PurgeRecorder.received, [])
+            dispatcher.flush()
+        keys = sorted([f'author:{author.pk}' for author in authors]
+                      + ['index'])
+        self.assertEqual(PurgeRecorder.received, [keys[:2], keys[2:]])
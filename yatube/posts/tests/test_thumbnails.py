@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default
+
+from ..models import Post
+from ..thumbnails import GEOMETRY, OPTIONS, prefetch_thumbnails
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPrefetchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        cls.names = []
+        for color in ('red', 'green', 'blue'):
+            content = BytesIO()
+            Image.new('RGB', (40, 20), color).save(content, format='PNG')
+            post = Post.objects.create(
+                text='Пост', author=author,
+                image=SimpleUploadedFile(f'{color}.png', content.getvalue(),
+                                         content_type='image/png')
+            )
+            cls.names.append(post.image.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_resolved_in_one_query(self):
+        """Миниатюры страницы читаются одним запросом, потом из кэша."""
+        with self.assertNumQueries(1):
+            urls = prefetch_thumbnails(self.names)
+        for name in self.names:
+            self.assertEqual(urls[name], (f'/media/{name}', False))
+        # Ключи совпадают с теми, что пишет обычный {% thumbnail %}.
+        for post in Post.objects.all():
+            default.backend.get_thumbnail(post.image, GEOMETRY, **OPTIONS)
+        with self.assertNumQueries(0):
+            urls = prefetch_thumbnails(self.names)
+        for name in self.names:
+            url, ready = urls[name]
+            self.assertTrue(ready)
+            self.assertTrue(url.startswith('/media/cache/'))
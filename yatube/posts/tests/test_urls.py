@@ -1,6 +1,7 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import Client, TestCase
 
 from ..models import Group, Post
@@ -24,6 +25,7 @@ class PostURLTest(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='TestUser')
         self.authorized_client = Client()
@@ -35,6 +37,7 @@ class PostURLTest(TestCase):
         """URL-адрес использует соответствующий шаблон."""
         templates_url_names = {
             '/': 'posts/index.html',
+            '/groups/': 'posts/groups.html',
             f'/group/{self.group.slug}/': 'posts/group_list.html',
             f'/profile/{self.user.username}/': 'posts/profile.html',
             f'/posts/{self.post.id}/': 'posts/post_detail.html',
@@ -50,6 +53,7 @@ class PostURLTest(TestCase):
         """Доступ к шаблонам для неавторизованных пользователей."""
         pages_for_all = [
             '/',
+            '/groups/',
             f'/group/{self.group.slug}/',
             f'/profile/{self.user.username}/',
             f'/posts/{self.post.id}/'
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from datetime import timedelta
 
 from django import forms
 from django.conf import settings
@@ -8,8 +9,11 @@ from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
-from ..models import Follow, Group, Post
+from ..archive import archive_posts
+from ..feed import FeedRow
+from ..models import ArchivedPost, Follow, Group, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -56,6 +60,7 @@ class PostViewTest(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='TestUser')
         self.authorized_client = Client()
@@ -124,7 +129,9 @@ class PostViewTest(TestCase):
         """Шаблон index сформирован с правильным контекстом."""
         response = self.author_client.get(reverse('posts:index'))
         first_post = response.context['page_obj'][0]
-        self.assertIsInstance(first_post, Post)
+        self.assertIsInstance(first_post, FeedRow)
+        self.assertEqual(first_post.pk, Post.objects.first().pk)
+        self.assertEqual(first_post.author.username, 'SomeUser')
         self.assertTrue(first_post.image)
 
     def test_group_list_show_correct_context(self):
@@ -194,6 +201,127 @@ class PostViewTest(TestCase):
         )
         self.assertNotEqual(old_response, new_response)
 
+    def test_groups_page_show_group_stats(self):
+        """Каталог групп показывает предрасчитанную статистику."""
+        response = self.guest_client.get(reverse('posts:groups'))
+        group = response.context['page_obj'][0]
+        self.assertEqual(group, PostViewTest.group)
+        self.assertEqual(group.stats.posts_count, 13)
+        self.assertEqual(group.stats.top_authors_list, ['SomeUser'])
+
+    def test_group_stats_follow_post_changes(self):
+        """Статистика группы обновляется при переносе поста."""
+        another_group = Group.objects.create(
+            title='Другая группа',
+            slug='another-group-slug'
+        )
+        post = Post.objects.filter(group=PostViewTest.group).first()
+        post.group = another_group
+        post.save()
+        PostViewTest.group.stats.refresh_from_db()
+        another_group.stats.refresh_from_db()
+        self.assertEqual(PostViewTest.group.stats.posts_count, 12)
+        self.assertEqual(another_group.stats.posts_count, 1)
+        post.delete()
+        another_group.stats.refresh_from_db()
+        self.assertEqual(another_group.stats.posts_count, 0)
+        self.assertIsNone(another_group.stats.last_post)
+        self.assertEqual(another_group.stats.top_authors_list, [])
+
+    def test_group_stats_follow_author_rename(self):
+        """Переименованный автор показывается в каталоге под новым именем."""
+        user = User.objects.get(pk=PostViewTest.user.pk)
+        user.username = 'Renamed'
+        user.save()
+        response = self.guest_client.get(reverse('posts:groups'))
+        group = response.context['page_obj'][0]
+        self.assertEqual(group.stats.top_authors_list, ['Renamed'])
+        self.assertContains(
+            response, reverse('posts:profile', args=('Renamed',)))
+
+    def test_group_stats_updated_without_recount(self):
+        """Новый пост меняет счётчик группы без пересчёта всех постов."""
+        stats = PostViewTest.group.stats
+        newcomer = User.objects.create_user(username='Newcomer')
+        post = Post.objects.create(author=newcomer, text='Новичок',
+                                   group=PostViewTest.group)
+        stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 14)
+        self.assertEqual(stats.last_post, post.created)
+        self.assertEqual(stats.top_authors_list, ['SomeUser', 'Newcomer'])
+        with self.assertNumQueries(4):
+            Post.objects.create(author=PostViewTest.user, text='Ещё пост',
+                                group=PostViewTest.group)
+
+    def test_archived_posts_stay_visible(self):
+        """Архивные посты пропадают из ленты, но остаются в профиле."""
+        old = timezone.now() - timedelta(days=400)
+        old_ids = list(Post.objects.order_by('pk')
+                       .values_list('pk', flat=True)[:3])
+        Post.objects.filter(pk__in=old_ids).update(created=old)
+        archived = archive_posts(timezone.now() - timedelta(days=365))
+        self.assertEqual(archived, 3)
+        self.assertFalse(Post.objects.filter(pk__in=old_ids).exists())
+        cache.clear()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 10)
+        response = self.guest_client.get(
+            self.pages_with_paginator[2] + '?page=2')
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 13)
+        self.assertEqual(sorted(post.pk for post in page), old_ids)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': old_ids[0]}))
+        self.assertIsInstance(response.context['post'], ArchivedPost)
+        self.assertTrue(response.context['archived'])
+        self.assertTrue(response.context['post'].image)
+        PostViewTest.group.stats.refresh_from_db()
+        self.assertEqual(PostViewTest.group.stats.posts_count, 13)
+
+    def test_feeds_show_excerpt(self):
+        """Ленты выводят анонс без загрузки полного текста."""
+        long_post = Post.objects.create(
+            text='<b>Начало</b>\n' + 'слово ' * 100 + 'КОНЕЦ',
+            author=PostViewTest.user,
+            group=PostViewTest.group
+        )
+        self.assertTrue(long_post.excerpt.endswith('…'))
+        for url in self.pages_with_paginator:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                post = response.context['page_obj'][0]
+                if isinstance(post, Post):
+                    self.assertIn('text', post.get_deferred_fields())
+                content = response.content.decode()
+                self.assertIn('&lt;b&gt;Начало&lt;/b&gt;<br>', content)
+                self.assertNotIn('КОНЕЦ', content)
+                self.assertIn('читать дальше', content)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': long_post.pk}))
+        self.assertIn('КОНЕЦ', response.content.decode())
+
+    def test_short_post_with_ellipsis_not_truncated(self):
+        """Короткий пост с многоточием в конце не считается обрезанным."""
+        Post.objects.create(text='Продолжение следует…',
+                            author=PostViewTest.user,
+                            group=PostViewTest.group)
+        for url in self.pages_with_paginator:
+            with self.subTest(url=url):
+                content = self.guest_client.get(url).content.decode()
+                self.assertIn('Продолжение следует…', content)
+                self.assertNotIn('читать дальше', content)
+
+    @override_settings(RATELIMITS={'profile_follow': '1/m'})
+    def test_profile_follow_rate_limit(self):
+        """Превышение лимита подписок возвращает 429 с Retry-After"""
+        cache.clear()
+        url = reverse('posts:profile_follow', kwargs={
+            'username': 'SomeUser'})
+        self.authorized_client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
     def test_following_for_authorized(self):
         """Авторизованный юзер может подписываться"""
         self.authorized_client.get(reverse('posts:profile_follow', kwargs={
@@ -0,0 +1,133 @@
+"""Пакетное чтение миниатюр sorl-thumbnail для страницы постов.
+
+{% thumbnail %} ищет каждую миниатюру в хранилище ключей sorl отдельно
+(кэш, затем база). prefetch_thumbnails считает ключи миниатюр для всей
+страницы сразу, читает их одним cache.get_many и одним запросом к
+KVStore, а недостающие миниатюры отдаёт фоновому пулу. Пока миниатюры
+нет, страница показывает исходную картинку.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from core import metrics
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import \
+    KVStore as CachedDBKVStore
+from sorl.thumbnail.models import KVStore
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Миниатюра картинки поста в лентах и на странице поста.
+GEOMETRY = '960x339'
+
+OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS,
+                               thread_name_prefix='thumbnails')
+
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def image_name(post):
+    """Имя картинки поста: FeedRow хранит его строкой."""
+    return getattr(post.image, 'name', post.image) or ''
+
+
+def source_file(name):
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def thumbnail_file(source):
+    """Повторяет выбор опций и имени файла из ThumbnailBackend."""
+    backend = default.backend
+    options = dict(OPTIONS)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, GEOMETRY, options)
+    return ImageFile(name, default.storage)
+
+
+def read_many(keys):
+    """Читает значения ключей sorl: одним get_many и одним запросом."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        found = {key: kvstore._get_raw(key) for key in keys}
+        missing = ()
+    else:
+        found = kvstore.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+    if missing:
+        found.update(KVStore.objects.filter(key__in=missing)
+                     .values_list('key', 'value'))
+        # Как и sorl, запоминаем отсутствие ключа, чтобы не ходить в базу.
+        kvstore.cache.set_many(
+            {key: found.get(key, EMPTY_VALUE) for key in missing},
+            thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+    return {key: value for key, value in found.items()
+            if value is not None and value != EMPTY_VALUE}
+
+
+def prefetch_thumbnails(names):
+    """Возвращает {имя картинки: (url, готова ли миниатюра)}.
+
+    Для картинок без миниатюры возвращается адрес исходного файла,
+    а миниатюра ставится в очередь фонового пула.
+    """
+    names = {name for name in names if name}
+    sources = {name: source_file(name) for name in names}
+    keys = {
+        add_prefix(thumbnail_file(source).key): name
+        for name, source in sources.items()
+    }
+    found = read_many(list(keys))
+    urls = {}
+    for key, name in keys.items():
+        if key in found:
+            urls[name] = (deserialize_image_file(found[key]).url, True)
+        else:
+            urls[name] = (sources[name].url, False)
+            # Миниатюра пишет в KVStore из другого потока: запускаем её
+            # после коммита текущей транзакции.
+            transaction.on_commit(partial(generate, sources[name]))
+    metrics.increment('thumbnails.hits', len(found))
+    metrics.increment('thumbnails.misses', len(keys) - len(found))
+    return urls
+
+
+def generate(source):
+    with _pending_lock:
+        if source.name in _pending:
+            return None
+        _pending.add(source.name)
+    return _executor.submit(_generate, source)
+
+
+def _generate(source):
+    try:
+        default.backend.get_thumbnail(source, GEOMETRY, **OPTIONS)
+    except Exception:
+        metrics.increment('thumbnails.errors')
+        logger.exception('Не удалось сделать миниатюру %s', source.name)
+    finally:
+        with _pending_lock:
+            _pending.discard(source.name)
+        connections.close_all()
@@ -0,0 +1,141 @@
+"""Отложенное удаление пользователей и групп.
+
+tombstone_user/tombstone_group сразу скрывают объект, а purge удаляет
+его зависимые строки пачками, каждая в своей транзакции. Прогресс
+хранится в самих данных (удалённые строки не возвращаются), поэтому
+прерванную очистку можно просто запустить снова.
+"""
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+from . import moderation, sharding
+from .models import (ArchivedComment, ArchivedPost, Comment, Follow, Group,
+                     Post, Tombstone)
+from .signals import bulk_changed
+
+User = get_user_model()
+
+TOMBSTONES_CACHE_KEY = 'posts:tombstones'
+
+
+def hidden_ids(kind):
+    """Возвращает множество id скрытых объектов вида kind."""
+    tombstones = cache.get(TOMBSTONES_CACHE_KEY)
+    if tombstones is None:
+        tombstones = {Tombstone.USER: set(), Tombstone.GROUP: set()}
+        for tombstone_kind, object_id in Tombstone.objects.values_list(
+                'kind', 'object_id'):
+            tombstones[tombstone_kind].add(object_id)
+        cache.set(TOMBSTONES_CACHE_KEY, tombstones, None)
+    return tombstones[kind]
+
+
+def exclude_hidden_authors(queryset):
+    """Убирает из выборки строки удаляемых авторов."""
+    authors = hidden_ids(Tombstone.USER)
+    if authors:
+        queryset = queryset.exclude(author_id__in=authors)
+    return queryset
+
+
+def exclude_hidden(posts):
+    """Убирает из выборки посты удаляемых авторов и групп."""
+    posts = exclude_hidden_authors(posts)
+    groups = hidden_ids(Tombstone.GROUP)
+    if groups:
+        posts = posts.exclude(group_id__in=groups)
+    return posts
+
+
+def tombstone_user(user):
+    Tombstone.objects.get_or_create(kind=Tombstone.USER, object_id=user.pk)
+    cache.delete(TOMBSTONES_CACHE_KEY)
+    if user.is_active:
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+    bulk_changed.send(sender=User, post_ids=(), group_ids=set(),
+                      author_ids={user.pk})
+
+
+def tombstone_group(group):
+    Tombstone.objects.get_or_create(kind=Tombstone.GROUP, object_id=group.pk)
+    cache.delete(TOMBSTONES_CACHE_KEY)
+    bulk_changed.send(sender=Group, post_ids=(), group_ids={group.pk},
+                      author_ids=set())
+
+
+def delete_in_chunks(queryset, chunk_size=moderation.CHUNK_SIZE,
+                     progress=None):
+    deleted = 0
+    for ids in moderation.chunked_ids(queryset, chunk_size):
+        with transaction.atomic(using=queryset.db):
+            chunk = queryset.model.objects.using(queryset.db).filter(
+                pk__in=ids)
+            chunk._raw_delete(chunk.db)
+        deleted += len(ids)
+        if progress:
+            progress(deleted)
+    return deleted
+
+
+def ungroup_in_chunks(queryset, chunk_size=moderation.CHUNK_SIZE,
+                      progress=None):
+    updated = 0
+    for ids in moderation.chunked_ids(queryset, chunk_size):
+        queryset.model.objects.using(queryset.db).filter(
+            pk__in=ids).update(group=None)
+        updated += len(ids)
+        if progress:
+            progress(updated)
+    return updated
+
+
+def run_stage(tombstone, stage, chunk_size):
+    base = tombstone.processed
+
+    def progress(done):
+        tombstone.processed = base + done
+        Tombstone.objects.filter(pk=tombstone.pk).update(
+            processed=tombstone.processed)
+
+    stage(chunk_size=chunk_size, progress=progress)
+
+
+def purge(tombstone, chunk_size=moderation.CHUNK_SIZE):
+    """Удаляет объект и всё, что от него зависит."""
+    if tombstone.kind == Tombstone.USER:
+        user_id = tombstone.object_id
+        stages = (
+            *(partial(delete_in_chunks, comments) for comments in
+              sharding.every_shard(Comment.objects.filter(author_id=user_id))),
+            partial(delete_in_chunks, Follow.objects.filter(user_id=user_id)),
+            partial(delete_in_chunks,
+                    Follow.objects.filter(author_id=user_id)),
+            *(partial(moderation.delete_posts, posts) for posts in
+              sharding.every_shard(Post.objects.filter(author_id=user_id))),
+            # Файлы картинок архивных постов подберёт collect_media_garbage.
+            partial(delete_in_chunks,
+                    ArchivedComment.objects.filter(author_id=user_id)),
+            partial(delete_in_chunks,
+                    ArchivedComment.objects.filter(post__author_id=user_id)),
+            partial(delete_in_chunks,
+                    ArchivedPost.objects.filter(author_id=user_id)),
+        )
+        owner = User.objects.filter(pk=user_id)
+    else:
+        group_id = tombstone.object_id
+        stages = (
+            *(partial(moderation.regroup_posts, posts, None) for posts in
+              sharding.every_shard(Post.objects.filter(group_id=group_id))),
+            partial(ungroup_in_chunks,
+                    ArchivedPost.objects.filter(group_id=group_id)),
+        )
+        owner = Group.objects.filter(pk=group_id)
+    for stage in stages:
+        run_stage(tombstone, stage, chunk_size)
+    owner.delete()
+    tombstone.delete()
+    cache.delete(TOMBSTONES_CACHE_KEY)
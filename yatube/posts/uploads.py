@@ -0,0 +1,154 @@
+"""Потоковая проверка и обработка загружаемых картинок.
+
+ImageUploadHandler ограничивает размер загрузки и размеры картинки по
+заголовку файла ещё до того, как Django начнёт его декодировать.
+Нормализация (поворот по EXIF, удаление EXIF, уменьшение) и расчёт
+метаданных для вёрстки (размеры, средний цвет, крошечное превью)
+выполняются в ограниченном пуле потоков, чтобы одновременно
+декодировалось не больше POST_IMAGE_WORKERS картинок.
+"""
+import base64
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from core import metrics
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from PIL import Image, ImageOps
+
+HEADER_LIMIT = 256 * 2 ** 10
+
+EMPTY_IMAGE_META = {
+    'image_width': None,
+    'image_height': None,
+    'image_color': '',
+    'image_placeholder': '',
+}
+
+_executor = ThreadPoolExecutor(max_workers=settings.POST_IMAGE_WORKERS,
+                               thread_name_prefix='image-upload')
+
+
+def read_image_size(head):
+    """Возвращает размеры картинки по началу файла или None.
+
+    Для картинок больше Image.MAX_IMAGE_PIXELS Pillow уже при открытии
+    бросает Image.DecompressionBombError, он передаётся вызывающему.
+    """
+    try:
+        with Image.open(BytesIO(head)) as image:
+            return image.size
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Отбрасывает слишком большие картинки прямо во время загрузки.
+
+    Причина отказа сохраняется в request.upload_errors по имени поля.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.head = b''
+        self.checked = False
+
+    def reject(self, message):
+        errors = getattr(self.request, 'upload_errors', {})
+        errors[self.field_name] = message
+        self.request.upload_errors = errors
+        metrics.increment('uploads.rejected')
+        raise SkipFile(message)
+
+    def reject_dimensions(self):
+        self.reject('Картинка слишком большая. Максимальная сторона: '
+                    f'{settings.POST_IMAGE_MAX_DIMENSION} пикселей.')
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_BYTES:
+            self.reject('Файл слишком большой. Максимальный размер: '
+                        f'{settings.POST_IMAGE_MAX_BYTES // 2 ** 20} МБ.')
+        if not self.checked:
+            self.head += raw_data
+            try:
+                size = read_image_size(self.head)
+            except Image.DecompressionBombError:
+                self.reject_dimensions()
+            if size is not None:
+                self.checked = True
+                self.head = b''
+                if max(size) > settings.POST_IMAGE_MAX_DIMENSION:
+                    self.reject_dimensions()
+            elif len(self.head) >= HEADER_LIMIT:
+                self.checked = True
+                self.head = b''
+        return raw_data
+
+    def file_complete(self, file_size):
+        metrics.observe('uploads.bytes', file_size)
+        return None
+
+
+def describe_image(image):
+    """Возвращает размеры, средний цвет и data-URI превью картинки."""
+    meta = dict(EMPTY_IMAGE_META)
+    meta['image_width'], meta['image_height'] = image.size
+    try:
+        preview = image.convert('RGB')
+    except OSError:
+        # Битые данные картинки: браузер покажет её как сможет,
+        # а размеры из заголовка всё равно пригодятся.
+        return meta
+    red, green, blue = preview.resize((1, 1), Image.BOX).getpixel((0, 0))
+    preview.thumbnail((settings.POST_IMAGE_PLACEHOLDER_SIZE,) * 2)
+    output = BytesIO()
+    preview.save(output, format='PNG', optimize=True)
+    meta['image_color'] = f'#{red:02x}{green:02x}{blue:02x}'
+    meta['image_placeholder'] = (
+        'data:image/png;base64,' + base64.b64encode(output.getvalue()).decode()
+    )
+    return meta
+
+
+def normalize_image(upload):
+    """Поворачивает картинку по EXIF, удаляет EXIF и уменьшает.
+
+    Возвращает новый файл или исходный, если менять ничего не нужно.
+    Метаданные итоговой картинки кладутся в его атрибут image_meta.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        image_format = image.format
+        oversized = max(image.size) > settings.POST_IMAGE_RESIZE_TO
+        has_exif = bool(image.getexif())
+        if not (oversized or has_exif) or getattr(image, 'is_animated', False):
+            upload.image_meta = describe_image(image)
+            upload.seek(0)
+            return upload
+        image = ImageOps.exif_transpose(image)
+        image.info.pop('exif', None)
+        if oversized:
+            image.thumbnail((settings.POST_IMAGE_RESIZE_TO,) * 2)
+        options = {'quality': 90}
+        if 'icc_profile' in image.info:
+            options['icc_profile'] = image.info['icc_profile']
+        output = BytesIO()
+        image.save(output, format=image_format, **options)
+        image_meta = describe_image(image)
+    name = os.path.basename(upload.name)
+    upload = InMemoryUploadedFile(output, 'image', name, upload.content_type,
+                                  output.tell(), None)
+    upload.image_meta = image_meta
+    return upload
+
+
+def process_upload(upload):
+    started = time.monotonic()
+    try:
+        return _executor.submit(normalize_image, upload).result()
+    finally:
+        metrics.observe('uploads.processing_seconds',
+                        time.monotonic() - started)
@@ -6,6 +6,7 @@ from . import views
 app_name = 'posts'
 
 urlpatterns = [
+    path('groups/', views.groups, name='groups'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
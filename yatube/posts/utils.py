@@ -7,3 +7,51 @@ def pagination(request, post_list):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def surrogate_keys(posts):
+    """Метки прокси для страниц, на которых выводятся posts."""
+    keys = set()
+    for post in posts:
+        keys.add(f'post:{post.pk}')
+        keys.add(f'author:{post.author_id}')
+        if post.group:
+            keys.add(f'group:{post.group.slug}')
+    return keys
+
+
+class ChainedQuerySets:
+    """Последовательность из нескольких querysets подряд для Paginator.
+
+    Каждый следующий queryset должен целиком идти после предыдущего
+    в нужном порядке (например, горячие посты, затем архивные).
+    """
+
+    def __init__(self, *querysets):
+        self.querysets = querysets
+        self._counts = None
+
+    def counts(self):
+        if self._counts is None:
+            self._counts = [queryset.count() for queryset in self.querysets]
+        return self._counts
+
+    def count(self):
+        return sum(self.counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            stop = self.count()
+        items = []
+        for queryset, count in zip(self.querysets, self.counts()):
+            if start < count and stop > 0:
+                items.extend(queryset[max(start, 0):min(stop, count)])
+            start -= count
+            stop -= count
+        return items
@@ -1,66 +1,147 @@
+from core.pagecache import cache_page_with_holes
+from core.ratelimit import ratelimit
+from core.surrogate import cache_in_proxy, tag
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
+from users.cache import get_user_or_404
 
+from . import comment_queue, sharding
+from .cache import get_group_or_404
+from .feed import CachedFeed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import pagination
+from .models import ArchivedPost, Follow, Group, Post, Tombstone
+from .thumbnails import prefetch_thumbnails
+from .tombstones import exclude_hidden, exclude_hidden_authors, hidden_ids
+from .utils import ChainedQuerySets, pagination, surrogate_keys
 
 
+def get_post_or_404(post_id):
+    post = sharding.find_post(Post.objects.all(), post_id)
+    if post is None:
+        raise Http404
+    return post
+
+
+def get_author_or_404(username):
+    author = get_user_or_404(username)
+    if author.pk in hidden_ids(Tombstone.USER):
+        raise Http404
+    return author
+
+
+@cache_in_proxy
+@cache_page_with_holes()
 def index(request):
+    page_obj = pagination(request, CachedFeed(
+        'index',
+        sharding.feed(exclude_hidden(
+            Post.objects.select_related('author', 'group').defer('text'))),
+        exclude_authors=hidden_ids(Tombstone.USER),
+        exclude_groups=hidden_ids(Tombstone.GROUP)
+    ))
+    tag(request, 'index', *surrogate_keys(page_obj))
     context = {
-        'page_obj': pagination(
-            request, Post.objects.select_related('group').all()
-        ),
+        'page_obj': page_obj,
         'index': True
     }
     return render(request, 'posts/index.html', context)
 
 
+def groups(request):
+    context = {
+        'page_obj': pagination(
+            request,
+            Group.objects.select_related('stats')
+            .exclude(pk__in=hidden_ids(Tombstone.GROUP))
+            .order_by('title')
+        )
+    }
+    return render(request, 'posts/groups.html', context)
+
+
+@cache_in_proxy
+@cache_page_with_holes()
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = get_group_or_404(slug)
+    if group.pk in hidden_ids(Tombstone.GROUP):
+        raise Http404
+    page_obj = pagination(request, sharding.feed(exclude_hidden(
+        Post.objects.select_related('author', 'group').defer('text')
+        .filter(group=group)
+    )))
+    tag(request, f'group:{group.slug}', *surrogate_keys(page_obj))
     context = {
         'group': group,
-        'page_obj': pagination(request, Post.objects.filter(group=group))
+        'page_obj': page_obj
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_in_proxy
+@cache_page_with_holes()
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    following = (request.user.is_authenticated) and (Follow.objects.filter(
-        user__username=request.user, author=author).exists())
-    context = {
-        'page_obj': pagination(request, (
-            Post.objects.select_related('author').filter(author=author))
+    author = get_author_or_404(username)
+    page_obj = pagination(request, ChainedQuerySets(
+        sharding.for_author(
+            Post.objects.select_related('author', 'group').defer('text')
+            .filter(author=author),
+            author.pk
         ),
-        'author': author,
-        'following': following
+        ArchivedPost.objects.select_related('author', 'group').defer('text')
+        .filter(author=author)
+    ))
+    tag(request, f'author:{author.pk}', *surrogate_keys(page_obj))
+    context = {
+        'page_obj': page_obj,
+        'author': author
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_in_proxy
+@cache_page_with_holes(bypass=comment_queue.has_pending)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = sharding.find_post(Post.objects.all(), post_id)
+    archived = post is None
+    if archived:
+        post = get_object_or_404(ArchivedPost, pk=post_id)
+    if post.author_id in hidden_ids(Tombstone.USER):
+        raise Http404
+    tag(request, *surrogate_keys([post]))
     form = CommentForm(request.POST or None)
-    comments = post.comments.all
+    comments = exclude_hidden_authors(post.comments.all())
+    if (settings.COMMENTS_WRITE_BEHIND and request.user.is_authenticated
+            and not archived):
+        comments = [
+            *comment_queue.pending_comments(request, post),
+            *comments
+        ]
+    image_url, image_ready = prefetch_thumbnails([post.image.name]).get(
+        post.image.name, ('', True))
     context = {
         'post': post,
+        'image_url': image_url,
+        'image_ready': image_ready,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'archived': archived
     }
     return render(request, 'posts/post_detail.html', context)
 
 
 @login_required
+@ratelimit('post_create', methods=('POST',))
 def post_create(request):
     form = PostForm(request.POST or None,
-                    files=request.FILES or None)
+                    files=request.FILES or None,
+                    upload_errors=getattr(request, 'upload_errors', None))
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
         return redirect('posts:profile', username=request.user)
-    form = PostForm()
     context = {
         'form': form
     }
@@ -69,18 +150,18 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_post_or_404(post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post.id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None,
-                    instance=post)
+                    instance=post,
+                    upload_errors=getattr(request, 'upload_errors', None))
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
         return redirect('posts:post_detail', post_id=post.id)
-    form = PostForm()
     context = {
         'form': form,
         'is_edit': True
@@ -89,8 +170,11 @@ def post_edit(request, post_id):
 
 
 @login_required
+@ratelimit('add_comment')
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    if settings.COMMENTS_WRITE_BEHIND:
+        return add_comment_write_behind(request, post_id)
+    post = get_post_or_404(post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -100,12 +184,29 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def add_comment_write_behind(request, post_id):
+    get_post_or_404(post_id)
+    form = CommentForm(request.POST or None)
+    if form.is_valid():
+        text = form.cleaned_data['text']
+        queue_id = comment_queue.enqueue(post_id, request.user.pk, text)
+        comment_queue.remember_pending(request, queue_id, post_id, text)
+    return redirect('posts:post_detail', post_id=post_id)
+
+
+@cache_in_proxy
 @login_required
 def follow_index(request):
     follower = request.user
+    page_obj = pagination(request, sharding.authors_feed(
+        exclude_hidden(
+            Post.objects.select_related('author', 'group').defer('text')),
+        Follow.objects.filter(user=follower).values_list('author_id',
+                                                         flat=True)
+    ))
+    tag(request, *surrogate_keys(page_obj))
     context = {
-        'page_obj': pagination(request, Post.objects.filter(
-            author__following__user=follower)),
+        'page_obj': page_obj,
         'follower': follower,
         'follow': True
     }
@@ -113,9 +214,10 @@ def follow_index(request):
 
 
 @login_required
+@ratelimit('profile_follow')
 def profile_follow(request, username):
     follower = request.user
-    author = get_object_or_404(User, username=username)
+    author = get_author_or_404(username)
     if follower != author:
         Follow.objects.get_or_create(
             user=follower, author=author)
@@ -125,7 +227,7 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     follower = request.user
-    author = get_object_or_404(User, username=username)
+    author = get_user_or_404(username)
     Follow.objects.filter(
         user=follower, author=author).delete()
     return redirect('posts:profile', username=username)
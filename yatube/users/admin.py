@@ -0,0 +1,15 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
+from posts.admin import TombstoneDeleteMixin
+from posts.tombstones import tombstone_user
+
+User = get_user_model()
+
+
+class TombstoneUserAdmin(TombstoneDeleteMixin, UserAdmin):
+    tombstone = staticmethod(tombstone_user)
+
+
+admin.site.unregister(User)
+admin.site.register(User, TombstoneUserAdmin)
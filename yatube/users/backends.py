@@ -0,0 +1,13 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .cache import get_cached_user
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, загружающий request.user из кэша."""
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        if user is not None and self.user_can_authenticate(user):
+            return user
+        return None
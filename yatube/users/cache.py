@@ -0,0 +1,131 @@
+from core.bloom import BloomFilter
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+
+User = get_user_model()
+
+USER_CACHE_KEY = 'users:user:{}'
+
+USERNAME_CACHE_KEY = 'users:username:{}'
+
+USERNAMES_FILTER_KEY = 'users:usernames-filter'
+
+USERNAMES_FILTER_LOCK_KEY = 'users:usernames-filter:lock'
+
+
+def get_cached_user(user_id):
+    """Возвращает пользователя по id из кэша или из базы."""
+    key = USER_CACHE_KEY.format(user_id)
+    user = cache.get(key, version=settings.USER_CACHE_VERSION)
+    if user is None:
+        user = User._default_manager.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT,
+                      version=settings.USER_CACHE_VERSION)
+    return user
+
+
+def invalidate_user(user_id):
+    cache.delete(USER_CACHE_KEY.format(user_id),
+                 version=settings.USER_CACHE_VERSION)
+
+
+def lock_usernames_filter():
+    return cache.add(USERNAMES_FILTER_LOCK_KEY, True,
+                     settings.USERNAMES_FILTER_LOCK_TIMEOUT)
+
+
+def unlock_usernames_filter():
+    cache.delete(USERNAMES_FILTER_LOCK_KEY)
+
+
+def build_usernames_filter():
+    """Строит фильтр Блума по всем существующим именам пользователей.
+
+    Фильтр сохраняется в кэш, только если удалось взять блокировку,
+    иначе он мог бы затереть имя, добавленное remember_username.
+    """
+    locked = lock_usernames_filter()
+    try:
+        usernames = User._default_manager.values_list('username', flat=True)
+        usernames_filter = BloomFilter.for_capacity(
+            2 * usernames.count() + settings.USERNAMES_FILTER_RESERVE
+        )
+        for username in usernames.iterator():
+            usernames_filter.add(username)
+        if locked:
+            cache.set(USERNAMES_FILTER_KEY, usernames_filter.dumps(),
+                      settings.USERNAMES_FILTER_TIMEOUT)
+    finally:
+        if locked:
+            unlock_usernames_filter()
+    return usernames_filter
+
+
+def get_usernames_filter():
+    data = cache.get(USERNAMES_FILTER_KEY)
+    if data is None:
+        return build_usernames_filter()
+    return BloomFilter.loads(data)
+
+
+def add_to_usernames_filter(username):
+    """Добавляет имя в сохранённый фильтр под блокировкой.
+
+    Если блокировку держит другой процесс, фильтр сбрасывается и будет
+    построен из базы заново.
+    """
+    if not lock_usernames_filter():
+        cache.delete(USERNAMES_FILTER_KEY)
+        return
+    try:
+        data = cache.get(USERNAMES_FILTER_KEY)
+        if data is not None:
+            usernames_filter = BloomFilter.loads(data)
+            usernames_filter.add(username)
+            cache.set(USERNAMES_FILTER_KEY, usernames_filter.dumps(),
+                      settings.USERNAMES_FILTER_TIMEOUT)
+    finally:
+        unlock_usernames_filter()
+
+
+def remember_username(username, user_id):
+    """Добавляет имя в кэш имя -> id и, после коммита, в фильтр."""
+    cache.set(USERNAME_CACHE_KEY.format(username), user_id,
+              settings.USER_CACHE_TIMEOUT)
+    transaction.on_commit(lambda: add_to_usernames_filter(username))
+
+
+def forget_username(username):
+    cache.delete(USERNAME_CACHE_KEY.format(username))
+
+
+def resolve_username(username):
+    """Возвращает id пользователя по имени или None.
+
+    Если фильтр Блума хранится в общем кэше, имена, которых точно нет
+    в нём, отбрасываются без обращения к базе.
+    """
+    key = USERNAME_CACHE_KEY.format(username)
+    user_id = cache.get(key)
+    if user_id is not None:
+        return user_id
+    if (settings.USERNAMES_FILTER_SHARED
+            and username not in get_usernames_filter()):
+        return None
+    user_id = User._default_manager.filter(
+        username=username).values_list('pk', flat=True).first()
+    if user_id is not None:
+        cache.set(key, user_id, settings.USER_CACHE_TIMEOUT)
+    return user_id
+
+
+def get_user_or_404(username):
+    user_id = resolve_username(username)
+    user = get_cached_user(user_id) if user_id is not None else None
+    if user is None or user.username != username:
+        raise Http404
+    return user
@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .cache import forget_username, invalidate_user, remember_username
+
+User = get_user_model()
+
+
+@receiver(post_init, sender=User)
+def remember_user_state(sender, instance, **kwargs):
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    invalidate_user(instance.pk)
+    if created or instance._loaded_username != instance.username:
+        forget_username(instance._loaded_username)
+        remember_username(instance.username, instance.pk)
+    instance._loaded_username = instance.username
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+    forget_username(instance._loaded_username)
+    forget_username(instance.username)
@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..cache import build_usernames_filter, get_cached_user, resolve_username
+
+User = get_user_model()
+
+
+class CachedUserTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='SomeUser')
+
+    def test_user_served_from_cache(self):
+        """Повторная загрузка пользователя не обращается к базе."""
+        get_cached_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cached_user(self.user.pk), self.user)
+
+    def test_cache_invalidated_on_save(self):
+        """Изменение пользователя сбрасывает кэш."""
+        get_cached_user(self.user.pk)
+        self.user.first_name = 'Имя'
+        self.user.save()
+        self.assertEqual(get_cached_user(self.user.pk).first_name, 'Имя')
+
+    def test_logged_in_request_skips_session_and_user_queries(self):
+        """Авторизованный запрос не читает сессию и пользователя из базы."""
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('about:author')
+        client.get(url)
+        with self.assertNumQueries(0):
+            response = client.get(url)
+        self.assertEqual(response.context['user'], self.user)
+
+
+class UsernameResolverTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='SomeUser')
+        self.client = Client()
+
+    @override_settings(USERNAMES_FILTER_SHARED=True)
+    def test_unknown_profile_404_without_queries(self):
+        """Несуществующий профиль отдаёт 404 без запросов к базе."""
+        self.client.get(reverse('posts:profile', args=('Unknown',)))
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse('posts:profile', args=('NoSuchUser',)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_signup_and_delete_update_resolver(self):
+        """Новые и удалённые пользователи сразу видны резолверу."""
+        self.client.get(reverse('posts:profile', args=('SomeUser',)))
+        User.objects.create_user(username='NewUser')
+        response = self.client.get(
+            reverse('posts:profile', args=('NewUser',)))
+        self.assertEqual(response.status_code, 200)
+        self.user.delete()
+        response = self.client.get(
+            reverse('posts:profile', args=('SomeUser',)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_process_local_filter_rechecked_in_db(self):
+        """Без общего кэша имя, которого нет в фильтре, ищется в базе."""
+        build_usernames_filter()
+        other = User.objects.create_user(username='OtherProcess')
+        # Регистрация в другом процессе: ни фильтр, ни кэш имени о ней
+        # не знают.
+        cache.delete('users:username:OtherProcess')
+        self.assertEqual(resolve_username('OtherProcess'), other.pk)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,9 +79,49 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # Второй шард. Пока его нет в POST_SHARDS, в нём ничего не хранится;
+    # тесты шардирования (posts.tests.test_sharding) создают его копию.
+    'shard_1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'shard_1.sqlite3'),
+    },
 }
 
+# Шардирование постов и комментариев по автору, см. posts.sharding.
+# Перечисленные alias-ы должны быть в DATABASES; пустой список - всё
+# хранится в default. POST_SHARD_MAP закрепляет автора за шардом.
+POST_SHARDS = []
+
+POST_SHARD_MAP = {}
+
+POST_SHARD_WORKERS = 4
+
+DATABASE_ROUTERS = ['posts.sharding.AuthorShardRouter']
+
+
+# Сессии хранятся в кэше с записью в базу, а request.user
+# загружается из кэша, см. users.backends.
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+
+USER_CACHE_TIMEOUT = 60 * 60
+
+USER_CACHE_VERSION = 1
+
+USERNAMES_FILTER_TIMEOUT = 60 * 60
+
+USERNAMES_FILTER_RESERVE = 1000
+
+# Фильтр Блума имён отсекает несуществующие профили без запроса к базе,
+# только если кэш общий для всех процессов (memcached, redis). В кэше
+# процесса фильтр не знает о регистрациях в других процессах.
+USERNAMES_FILTER_SHARED = False
+
+USERNAMES_FILTER_LOCK_TIMEOUT = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -123,10 +164,69 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+
+# В боевом режиме статика собирается с хэшами в именах и сжатыми
+# копиями; STATIC_SERVE включает её раздачу самим приложением.
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+STATIC_SERVE = not DEBUG
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загруженные файлы отдаёт core.views.serve_media.
+MEDIA_SERVE = True
+
+# Передавать отдачу файлов веб-серверу: None, 'x-sendfile' или
+# 'x-accel-redirect'. Для nginx FILES_ACCEL_PREFIX - internal-location,
+# смотрящий в MEDIA_ROOT.
+FILES_SENDFILE = None
+
+FILES_ACCEL_PREFIX = '/protected-media/'
+
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.ImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Тексты постов и комментариев длиннее стольких байт хранятся сжатыми,
+# см. core.compression. Файл словаря необязателен; после его смены
+# прежний словарь переносится в TEXT_COMPRESSION_DICTIONARIES
+# ({id: путь}) и выполняется compress_texts.
+TEXT_COMPRESSION_MIN_BYTES = 1024
+
+TEXT_COMPRESSION_LEVEL = 6
+
+TEXT_COMPRESSION_DICTIONARY = None
+
+TEXT_COMPRESSION_DICTIONARIES = {}
+
+# Поиск в админке распаковывает сжатые тексты только у стольких самых
+# новых строк, см. posts.admin.CompressedSearchMixin.
+ADMIN_SEARCH_DECOMPRESS_LIMIT = 1000
+
+POST_IMAGE_MAX_BYTES = 10 * 2 ** 20
+
+POST_IMAGE_MAX_DIMENSION = 10000
+
+POST_IMAGE_RESIZE_TO = 2560
+
+POST_IMAGE_WORKERS = 2
+
+# Большая сторона превью, которое показывается до загрузки картинки.
+POST_IMAGE_PLACEHOLDER_SIZE = 8
+
+# Файлы картинок моложе этого числа секунд не удаляются: одинаковые
+# загрузки делят один файл, и его может как раз подхватывать новый пост.
+POST_IMAGE_GRACE = 60 * 60
+
+# Потоки, в которых делаются недостающие миниатюры, см. posts.thumbnails.
+THUMBNAIL_WORKERS = 2
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -137,10 +237,91 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_ON_PAGE = 10
 
+GROUP_CACHE_TIMEOUT = 60 * 60
+
+# Страницы главной ленты в кэше, см. posts.feed.CachedFeed.
+FEED_CACHE_TIMEOUT = 20
+
+# Отрисованные посты в лентах, см. posts.snippets.
+SNIPPET_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Страницы для вошедших пользователей, см. core.pagecache.
+PAGE_CACHE_TIMEOUT = 60
+
+# Кэширующий прокси перед сайтом, см. core.surrogate. Анонимные страницы
+# помечаются Surrogate-Key и хранятся в прокси SURROGATE_MAX_AGE секунд.
+SURROGATE_MAX_AGE = 60
+
+# Адрес сброса меток в прокси; None - сброс отключён.
+SURROGATE_PURGE_URL = None
+
+# Метки копятся столько секунд и уходят одним запросом на пачку.
+SURROGATE_PURGE_DELAY = 0.5
+
+SURROGATE_PURGE_BATCH = 100
+
+SURROGATE_PURGE_TIMEOUT = 2
+
+# Посты старше этого срока переносит в архив команда archive_posts.
+POSTS_ARCHIVE_AFTER_DAYS = 365
+
+# Отложенная запись комментариев через локальную очередь
+# (переносятся в базу командой flush_comments).
+COMMENTS_WRITE_BEHIND = False
+
+COMMENTS_QUEUE_PATH = os.path.join(BASE_DIR, 'comments_queue.sqlite3')
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Сжатие ответов, см. core.middleware.CompressionMiddleware.
+COMPRESSION_MIN_SIZE = 1024
+
+COMPRESSION_CPU_BUDGET = 0.25
+
+COMPRESSION_CACHE_TIMEOUT = 10 * 60
+
+# Лимиты частоты запросов для пишущих view, см. core.ratelimit.
+RATELIMITS = {
+    'post_create': '10/m',
+    'add_comment': '30/m',
+    'profile_follow': '30/m',
+    'signup': '5/h',
+}
+
+# Адреса обратных прокси перед сайтом: от них core.ratelimit берёт IP
+# клиента из X-Forwarded-For.
+RATELIMIT_TRUSTED_PROXIES = []
+
+# default - двухуровневый кэш, см. core.tiered_cache: самые горячие
+# ключи (фрагменты шаблонов, группы, список скрытых авторов) читаются
+# из памяти процесса, остальное - из общего кэша shared.
 CACHES = {
     'default': {
+        'BACKEND': 'core.tiered_cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_PREFIXES': [
+                'template.cache.', 'posts:feed:', 'posts:group:',
+                'posts:tombstones', 'pages:generation',
+            ],
+            'L1_MAX_ENTRIES': 500,
+            'L1_MAX_BYTES': 2 * 1024 * 1024,
+        },
+    },
+    'shared': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'LOCATION': 'shared',
+    },
 }
+
+# Защита от одновременного пересчёта, см. core.cache.get_or_set:
+# сколько секунд после истечения отдаётся устаревшее значение,
+# время жизни блокировки пересчёта, сколько ждать чужого пересчёта
+# при пустом кэше и коэффициент раннего пересчёта (XFetch).
+STAMPEDE_STALE_TTL = 60
+
+STAMPEDE_LOCK_TIMEOUT = 30
+
+STAMPEDE_WAIT = 1
+
+STAMPEDE_BETA = 1.0
@@ -1,19 +1,26 @@
+from core.views import metrics, serve_media, serve_static
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics/', metrics, name='metrics'),
     path('', include('posts.urls', namespace='posts'))
 ]
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
 handler403 = 'core.views.permission_denied'
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+if settings.MEDIA_SERVE:
+    urlpatterns += [
+        re_path(r'^{}(?P<path>.*)$'.format(settings.MEDIA_URL.lstrip('/')),
+                serve_media),
+    ]
+if settings.STATIC_SERVE:
+    urlpatterns += [
+        re_path(r'^{}(?P<path>.*)$'.format(settings.STATIC_URL.lstrip('/')),
+                serve_static),
+    ]